@@ -0,0 +1,172 @@
+import json
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from time import perf_counter
+from typing import Dict, List
+
+"""
+Headless scenario runner: runs the named scenarios for N ticks (or replays recorded sessions) without opening
+a window and prints one JSON object per run, so results can be compared release to release.
+"""
+
+# the world modules log to stdout, keep it clean for the results
+with redirect_stdout(sys.stderr):
+    from world.world import World
+    from world.scenarios import SCENARIOS
+    from world.replay import Recording, get_world_type
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:
+    getrusage = None
+
+
+def get_peak_memory() -> int or None:
+    """ returns the peak resident memory of the process in bytes, None if the platform can't tell """
+    if not getrusage:
+        return None
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def time_systems(world: World, system_times: Dict[str, float]):
+    """ wraps the update of every system of the world so it adds its time to system_times """
+    for system in world.systems:
+        system_times.setdefault(system.NAME, 0)
+
+        def timed_update(update=system.update, system_name=system.NAME):
+            start_time = perf_counter()
+            update()
+            system_times[system_name] += perf_counter() - start_time
+
+        system.update = timed_update
+
+
+def count_tile_updates(world: World) -> int:
+    """ returns the tiles the systems visited in the last tick, the array worlds go through all of them """
+    if isinstance(world, World):
+        return sum(len(system.tiles) for system in world.systems)
+    return world.tile_count
+
+
+def run_scenario(name: str, ticks: int, backend: str, seed: int or None, workers: int) -> Dict:
+    with redirect_stdout(sys.stderr):
+        world = SCENARIOS[name](get_world_type(backend, seed, workers))
+    system_times: Dict[str, float] = {}
+    time_systems(world, system_times)
+    tile_updates = 0
+    start_time = perf_counter()
+    for _ in range(ticks):
+        world.update()
+        tile_updates += count_tile_updates(world)
+    total_time = perf_counter() - start_time
+    result = {
+        "scenario": name,
+        "backend": backend,
+        "width": world.width,
+        "height": world.height,
+        "ticks": ticks,
+        "seconds": total_time,
+        "ticks_per_second": ticks / total_time,
+        "tile_updates_per_second": tile_updates / total_time,
+        "system_seconds": system_times,
+        # everything in World.update that isn't a system, e.g. the deferred add / delete
+        "other_seconds": total_time - sum(system_times.values()),
+        "final_tiles": world.tile_count,
+        "peak_memory_bytes": get_peak_memory(),
+    }
+    world.close()
+    return result
+
+
+def run_replay(path: str, workers: int) -> Dict:
+    recording = Recording(path)
+    with redirect_stdout(sys.stderr):
+        session = recording.create_session(workers)
+    system_times: Dict[str, float] = {}
+    time_systems(session.world, system_times)
+    tick_times: List[float] = []
+    start_time = perf_counter()
+    for commands in recording:
+        world = session.world
+        for command in commands:
+            session.apply(command)
+        if session.world is not world:
+            time_systems(session.world, system_times)
+        tick_start_time = perf_counter()
+        session.update()
+        if not session.paused:
+            tick_times.append(perf_counter() - tick_start_time)
+    total_time = perf_counter() - start_time
+    tick_times.sort()
+    matches, difference = recording.check(session)
+    result = {
+        "replay": path,
+        "backend": recording.header["backend"],
+        "width": session.width,
+        "height": session.height,
+        "frames": len(recording.frames),
+        "ticks": len(tick_times),
+        "seconds": total_time,
+        "ticks_per_second": len(tick_times) / total_time,
+        "tick_seconds": {
+            "mean": sum(tick_times) / len(tick_times) if tick_times else None,
+            "p95": tick_times[int(len(tick_times) * 0.95)] if tick_times else None,
+            "max": tick_times[-1] if tick_times else None,
+        },
+        "system_seconds": system_times,
+        # commands and everything in World.update that isn't a system
+        "other_seconds": total_time - sum(system_times.values()),
+        "final_tiles": session.world.tile_count,
+        "peak_memory_bytes": get_peak_memory(),
+        "matches_recording": matches,
+        "difference": None if matches else difference,
+    }
+    session.world.close()
+    return result
+
+
+def main():
+    parser = ArgumentParser(
+        description="Runs OmbroBox scenarios headless and reports their performance as JSON"
+    )
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run, all of them if none is given")
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--backend", choices=("object", "array", "parallel"), default="object")
+    parser.add_argument("--workers", type=int, default=0, help="processes used by the parallel backend")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--list", action="store_true", help="list the available scenarios and exit")
+    parser.add_argument(
+        "--replay",
+        nargs="+",
+        metavar="PATH",
+        help="replay the sessions recorded with game.py --record instead of running scenarios"
+    )
+    args = parser.parse_args()
+    if args.list:
+        for name, scenario in SCENARIOS.items():
+            print(f"{name}: {scenario.__doc__.strip()}")
+        return
+    if args.replay:
+        for path in args.replay:
+            with ProcessPoolExecutor(1) as executor:
+                result = executor.submit(run_replay, path, args.workers).result()
+            print(json.dumps(result), flush=True)
+        return
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}, use --list to see the available ones")
+    for name in args.scenarios or SCENARIOS:
+        # every scenario runs in a fresh process so the peak memory is its own
+        with ProcessPoolExecutor(1) as executor:
+            result = executor.submit(
+                run_scenario, name, args.ticks, args.backend, args.seed, args.workers
+            ).result()
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
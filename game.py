@@ -1,11 +1,18 @@
+import os
+import random
 import sys
-from typing import List, Tuple
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import List, Tuple, Set
 
 import pygame
 from pygame.locals import *
 
-from world.world import World, Dir
+from world.world import World
 from world.tiles import TILES
+from world.profiler import Profiler
+from world.replay import Session, Recorder, Recording, Command, get_world_type
+from world.simulation import SimulationThread, Frame, ColorBuffers
 
 """
 All PyGame stuff is here (rendering & inputs)
@@ -18,6 +25,8 @@ SMALL_FONT = pygame.font.Font('font.otf', 14)
 
 # Game Setup
 FPS = 60
+SAVE_PATH = "world.ombx"
+MAX_BRUSH_RADIUS = 32
 fpsClock = pygame.time.Clock()
 WINDOW = pygame.display.set_mode((1280, 720), pygame.RESIZABLE)
 pygame.display.set_caption('OmbroBox')
@@ -26,134 +35,337 @@ pygame.display.set_icon(pygame.image.load("icon.png"))
 paused_text = FONT.render("Simulation paused", False, (255, 255, 255))
 
 
-def render(world: World, selected_tile: int, mouse_position: Tuple[int, int], paused: bool, tiles_info: bool):
-    # set window caption (show FPS)
-    pygame.display.set_caption(f'OmbroBox | FPS: {int(fpsClock.get_fps())}')
-    # render world
-    surface = pygame.Surface((world.width, world.height))
-    for tile in world.tiles:
-        surface.set_at((tile.x, tile.y), tile.color)
-    surface.set_at(mouse_position, (255, 255, 255))
-    scaled_surface = pygame.transform.scale(surface, WINDOW.get_size())
+class WorldRenderer:
+    """
+    Keeps the images published by the simulation, and their copy scaled to the window, in persistent surfaces.
+    When the renderer didn't miss any frame only the cells changed by the last tick are repainted
+    on the scaled surface.
+    """
+
+    # above this many changed cells rescaling the whole image is cheaper
+    MAX_REPAINTED_CELLS = 4096
+
+    def __init__(self):
+        self.buffers: ColorBuffers or None = None
+        # one surface reading straight from each color buffer
+        self.surfaces: Tuple[pygame.Surface, ...] = ()
+        self.scaled_surface: pygame.Surface or None = None
+        # window pixel where every world column / row starts, same mapping as pygame.transform.scale
+        self.columns: List[int] = []
+        self.rows: List[int] = []
+        self.last_tick: int = -1
+
+    def draw(self, frame: Frame) -> pygame.Surface:
+        """ returns the image of the frame scaled to the window """
+        buffers = frame.buffers
+        size = buffers.width, buffers.height
+        if buffers is not self.buffers:
+            self.buffers = buffers
+            self.surfaces = tuple(pygame.image.frombuffer(buffer, size, "RGB") for buffer in buffers.buffers)
+            self.scaled_surface = None
+        window_size = WINDOW.get_size()
+        # the simulation can't swap the buffers while the front one is read
+        with buffers.lock:
+            if self.scaled_surface is None or self.scaled_surface.get_size() != window_size:
+                self.scaled_surface = pygame.Surface(window_size, 0, self.surfaces[0])
+                self.columns = [-(-x * window_size[0] // size[0]) for x in range(size[0] + 1)]
+                self.rows = [-(-y * window_size[1] // size[1]) for y in range(size[1] + 1)]
+            elif frame.tick == self.last_tick:
+                return self.scaled_surface
+            elif frame.tick == self.last_tick + 1 and frame.changes is not None \
+                    and len(frame.changes) <= self.MAX_REPAINTED_CELLS:
+                self.repaint_changes(frame.changes, buffers.buffers[buffers.front])
+                self.last_tick = frame.tick
+                return self.scaled_surface
+            pygame.transform.scale(self.surfaces[buffers.front], window_size, self.scaled_surface)
+        self.last_tick = frame.tick
+        return self.scaled_surface
+
+    def repaint_changes(self, changes: Set[int], color_buffer: bytearray):
+        width = self.buffers.width
+        columns = self.columns
+        rows = self.rows
+        fill = self.scaled_surface.fill
+        for index in changes:
+            y, x = divmod(index, width)
+            fill(
+                color_buffer[index * 3:index * 3 + 3],
+                (columns[x], rows[y], columns[x + 1] - columns[x], rows[y + 1] - rows[y])
+            )
+
+
+def render(
+        renderer: WorldRenderer,
+        frame: Frame,
+        selected_tile: int,
+        mouse_position: Tuple[int, int],
+        brush_radius: int,
+        tiles_info: bool,
+        profiler: Profiler or None,
+        tick_rate: int
+):
+    # set window caption (show FPS, and the ticks per second against the target)
+    caption = f'OmbroBox | FPS: {int(fpsClock.get_fps())} | TPS: {frame.ticks_per_second}/{tick_rate}'
+    if frame.load_level:
+        caption += f' | load level {frame.load_level}'
+    pygame.display.set_caption(caption)
+    # render world, the overlays are drawn on the window so the scaled world image stays clean
+    WINDOW.blit(renderer.draw(frame), (0, 0))
+    cell_width = WINDOW.get_width() / frame.buffers.width
+    cell_height = WINDOW.get_height() / frame.buffers.height
+    if brush_radius:
+        pygame.draw.ellipse(
+            WINDOW,
+            (255, 255, 255),
+            (
+                int((mouse_position[0] - brush_radius) * cell_width),
+                int((mouse_position[1] - brush_radius) * cell_height),
+                max(int((brush_radius * 2 + 1) * cell_width), 1),
+                max(int((brush_radius * 2 + 1) * cell_height), 1)
+            ),
+            1
+        )
+    else:
+        pygame.draw.rect(
+            WINDOW,
+            (255, 255, 255),
+            (
+                int(mouse_position[0] * cell_width),
+                int(mouse_position[1] * cell_height),
+                max(int(cell_width), 1),
+                max(int(cell_height), 1)
+            )
+        )
     # render selected tile
     tile_text = FONT.render(
-        f"selected ({selected_tile + 1}/{len(TILES)}): {TILES[selected_tile].NAME}",
+        f"selected ({selected_tile + 1}/{len(TILES)}): {TILES[selected_tile].NAME}  brush: {brush_radius}",
         False,
         (255, 255, 255)
     )
-    scaled_surface.blit(tile_text, (10, 10))
+    WINDOW.blit(tile_text, (10, 10))
     # render additional information if tiles info is on
     if tiles_info:
-        total_particles_text = FONT.render(f"Total tiles: {len(world.tiles)}", False, (255, 255, 255))
-        scaled_surface.blit(total_particles_text, (10, 50))
-        tile = world.spatial_matrix[mouse_position[1]][mouse_position[0]]
-        if tile:
+        total_particles_text = FONT.render(f"Total tiles: {frame.tile_count}", False, (255, 255, 255))
+        WINDOW.blit(total_particles_text, (10, 50))
+        if profiler:
+            render_profile(profiler)
+        tile_info = frame.inspected
+        if tile_info:
+            tile_name, tile_heat = tile_info
             mouse_pos = pygame.mouse.get_pos()
             tile_type_text = SMALL_FONT.render(
-                f"Type: {tile.NAME}",
+                f"Type: {tile_name}",
                 False,
                 (255, 255, 255)
             )
             tile_type_text_shadow = SMALL_FONT.render(
-                f"Type: {tile.NAME}",
+                f"Type: {tile_name}",
                 False,
                 (0, 0, 0)
             )
-            scaled_surface.blit(tile_type_text_shadow, (mouse_pos[0] + 12, mouse_pos[1] + 2))
-            scaled_surface.blit(tile_type_text, (mouse_pos[0] + 10, mouse_pos[1]))
-            if "heat" in tile.__dict__:
+            WINDOW.blit(tile_type_text_shadow, (mouse_pos[0] + 12, mouse_pos[1] + 2))
+            WINDOW.blit(tile_type_text, (mouse_pos[0] + 10, mouse_pos[1]))
+            if tile_heat is not None:
                 tile_heat_text = SMALL_FONT.render(
-                    f"Heat: {tile.heat}",
+                    f"Heat: {tile_heat}",
                     False,
                     (255, 255, 255)
                 )
                 tile_heat_text_shadow = SMALL_FONT.render(
-                    f"Heat: {tile.heat}",
+                    f"Heat: {tile_heat}",
                     False,
                     (0, 0, 0)
                 )
-                scaled_surface.blit(tile_heat_text_shadow, (mouse_pos[0] + 12, mouse_pos[1] + 22))
-                scaled_surface.blit(tile_heat_text, (mouse_pos[0] + 10, mouse_pos[1] + 20))
+                WINDOW.blit(tile_heat_text_shadow, (mouse_pos[0] + 12, mouse_pos[1] + 22))
+                WINDOW.blit(tile_heat_text, (mouse_pos[0] + 10, mouse_pos[1] + 20))
     # render pause text if the simulation is paused
-    if paused:
-        scaled_surface.blit(paused_text, (WINDOW.get_width() - paused_text.get_width() - 10, 10))
-    # render surface to window
-    WINDOW.blit(scaled_surface, (0, 0))
+    if frame.paused:
+        WINDOW.blit(paused_text, (WINDOW.get_width() - paused_text.get_width() - 10, 10))
     pygame.display.flip()
 
 
+def render_profile(profiler: Profiler):
+    """ renders the rolling averages of the profiler under the tile count """
+    phases, counters, tile_types = profiler.get_breakdown()
+    lines: List[str] = [f"{name}: {seconds * 1000:.2f} ms" for name, seconds in phases.items()]
+    lines.append(
+        f"Moves: {counters.pop('moves'):.0f}  Swaps: {counters.pop('swaps'):.0f}  "
+        f"Transforms: {counters.pop('transforms'):.0f}"
+    )
+    lines += [f"{name} tiles: {count:.0f}" for name, count in counters.items()]
+    if tile_types:
+        visited = ", ".join(f"{name} {count:.0f}" for name, count in tile_types.most_common(5))
+        lines.append("Visited: " + visited)
+    for i, line in enumerate(lines):
+        WINDOW.blit(SMALL_FONT.render(line, False, (255, 255, 255)), (10, 80 + i * 18))
+
+
 def clamp(n, smallest, largest) -> int:
     ll: List[int] = [smallest, n, largest]
     ll.sort()
     return ll[1]
 
 
-def get_mouse_world_position(world: World) -> Tuple[int, int]:
+def get_mouse_world_position(width: int, height: int) -> Tuple[int, int]:
     window_size = WINDOW.get_size()
     mouse_pos = pygame.mouse.get_pos()
-    mouse_x = clamp(int((mouse_pos[0] / window_size[0]) * world.width), 0, world.width - 1)
-    mouse_y = clamp(int((mouse_pos[1] / window_size[1]) * world.height), 0, world.height - 1)
+    mouse_x = clamp(int((mouse_pos[0] / window_size[0]) * width), 0, width - 1)
+    mouse_y = clamp(int((mouse_pos[1] / window_size[1]) * height), 0, height - 1)
     return mouse_x, mouse_y
 
 
-def main():
-    world = World(160, 90)
-    selected_tile: int = 0
-    pause: bool = False
+def main(
+        session: Session,
+        recorder: Recorder or None = None,
+        recording: Recording or None = None,
+        trace_path: str or None = None,
+        tick_rate: int = SimulationThread.TICK_RATE
+):
+    """
+    runs the game on the given session, recording its commands or replaying the ones of a recording.
+    The session is updated by a SimulationThread at tick_rate ticks per second, this loop only turns
+    the inputs into commands and draws the frames it publishes. If a trace path is given the whole session
+    is profiled and the trace written there on quit
+    """
+    renderer = WorldRenderer()
     tiles_info: bool = False
+    # the updates are only profiled while the overlay is on, or all the time when tracing
+    profiler: Profiler or None = Profiler(trace=True) if trace_path else None
+    simulation = SimulationThread(session, recorder, recording, profiler, tick_rate)
+    simulation.start()
+    selected_tile: int = session.selected_tile
+    brush_radius: int = 0
+    # where the brush was last frame while a button is held, the stroke is painted from there to the mouse
+    stroke_start: Tuple[int, int] or None = None
 
     while True:
+        frame = simulation.frame
+        if not frame:
+            # the first tick isn't over yet
+            pygame.event.pump()
+            fpsClock.tick(FPS)
+            continue
         # Get mouse position
-        mouse_position = get_mouse_world_position(world)
-        # Get inputs
+        mouse_position = get_mouse_world_position(frame.buffers.width, frame.buffers.height)
+        # while replaying the selection comes from the recording
+        if simulation.replayed_frames:
+            selected_tile = session.selected_tile
+        # Get inputs, everything that changes the session becomes a command
+        commands: List[Command] = []
         for event in pygame.event.get():
             if event.type == QUIT:
+                simulation.stop()
+                if recorder:
+                    recorder.close(session)
+                if trace_path:
+                    profiler.dump(trace_path)
+                session.world.close()
                 pygame.quit()
                 sys.exit()
             if event.type == MOUSEWHEEL:
                 if event.y == -1:
-                    if selected_tile == 0:
-                        selected_tile = len(TILES) - 1
-                    else:
-                        selected_tile -= 1
+                    selected_tile = len(TILES) - 1 if selected_tile == 0 else selected_tile - 1
                 else:
-                    if selected_tile == len(TILES) - 1:
-                        selected_tile = 0
-                    else:
-                        selected_tile += 1
+                    selected_tile = 0 if selected_tile == len(TILES) - 1 else selected_tile + 1
+                commands.append(["select", selected_tile])
             if event.type == KEYDOWN:
                 if event.unicode == " ":
-                    pause = not pause
+                    commands.append(["pause"])
+                elif event.unicode in ("+", "="):
+                    brush_radius = min(brush_radius + 1, MAX_BRUSH_RADIUS)
+                elif event.unicode == "-":
+                    brush_radius = max(brush_radius - 1, 0)
                 elif event.scancode == 58:
                     # Press F1
                     tiles_info = not tiles_info
+                    if not trace_path:
+                        profiler = Profiler() if tiles_info else None
+                        simulation.profiler = profiler
                 elif event.scancode == 41:
                     # Press ESC
-                    world = World(160, 90)
-        if pygame.mouse.get_pressed()[0]:
-            world.add_tile(TILES[selected_tile], mouse_position[0], mouse_position[1])
-            if pygame.key.get_pressed()[K_LCTRL]:
-                for direction in Dir.ALL:
-                    world.add_tile(
-                        TILES[selected_tile],
-                        mouse_position[0] + direction[0],
-                        mouse_position[1] + direction[1]
-                    )
-        elif pygame.mouse.get_pressed()[2]:
-            world.delete_tile(mouse_position[0], mouse_position[1])
-            if pygame.key.get_pressed()[K_LCTRL]:
-                for direction in Dir.ALL:
-                    world.delete_tile(
-                        mouse_position[0] + direction[0],
-                        mouse_position[1] + direction[1]
-                    )
-        # update physics
-        if not pause:
-            world.update()
+                    commands.append(["reset"])
+                # saves and loads depend on a file, they can't be part of a recording
+                elif event.scancode == 62 and isinstance(session.world, World) \
+                        and not (recorder or recording):
+                    # Press F5
+                    commands.append(["save", SAVE_PATH])
+                elif event.scancode == 66 and isinstance(session.world, World) \
+                        and not (recorder or recording) and os.path.exists(SAVE_PATH):
+                    # Press F9
+                    commands.append(["load", SAVE_PATH])
+        if pygame.mouse.get_pressed()[0] or pygame.mouse.get_pressed()[2]:
+            start_x, start_y = stroke_start or mouse_position
+            if pygame.mouse.get_pressed()[0]:
+                commands.append([
+                    "add", selected_tile, mouse_position[0], mouse_position[1], start_x, start_y, brush_radius
+                ])
+            else:
+                commands.append([
+                    "delete", mouse_position[0], mouse_position[1], start_x, start_y, brush_radius
+                ])
+            stroke_start = mouse_position
+        else:
+            stroke_start = None
+        # the simulation ignores them while it's replaying
+        for command in commands:
+            simulation.send(command)
+        simulation.inspected_position = mouse_position if tiles_info else None
         # render
-        render(world, selected_tile, mouse_position, pause, tiles_info)
+        render_start_time = perf_counter()
+        render(renderer, frame, selected_tile, mouse_position, brush_radius, tiles_info, profiler, tick_rate)
+        if profiler and not frame.paused:
+            profiler.add_phase("Rendering", render_start_time, perf_counter())
         fpsClock.tick(FPS)
 
 
 if __name__ == '__main__':
-    main()
+    parser = ArgumentParser(description="OmbroBox, a simple physics sandbox")
+    parser.add_argument("--array", action="store_true", help="use the NumPy backed world (for big worlds)")
+    parser.add_argument("--size", nargs=2, type=int, default=(160, 90), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="update the NumPy backed world on this many processes"
+    )
+    parser.add_argument(
+        "--tps",
+        type=int,
+        default=SimulationThread.TICK_RATE,
+        help="ticks per second to aim for, under load heat and custom tiles are updated every other tick"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed of the random numbers, for reproducible runs"
+    )
+    parser.add_argument("--record", metavar="PATH", help="record the session to the given file")
+    parser.add_argument("--replay", metavar="PATH", help="replay the session recorded in the given file")
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="profile every tick and write a Chrome trace (chrome://tracing, Perfetto) to the file on quit"
+    )
+    args = parser.parse_args()
+    if args.replay:
+        game_recording = Recording(args.replay)
+        main(
+            game_recording.create_session(args.workers),
+            recording=game_recording,
+            trace_path=args.trace,
+            tick_rate=args.tps
+        )
+    else:
+        backend = "parallel" if args.workers else "array" if args.array else "object"
+        seed = args.seed
+        if args.record and seed is None:
+            # a recording always needs a seed to be replayed
+            seed = random.randrange(1 << 32)
+        game_session = Session(get_world_type(backend, seed, args.workers), *args.size)
+        main(
+            game_session,
+            Recorder(args.record, backend, seed, *args.size) if args.record else None,
+            trace_path=args.trace,
+            tick_rate=args.tps
+        )
@@ -0,0 +1,684 @@
+from typing import List, Type, Tuple, Iterable, Dict
+
+import numpy as np
+
+from world.profiler import Profiler
+from world.semirandom import RandomStream
+from world.world import Tile, SemiSolidTile, LiquidTile, GasTile, GenericSystem, Dir, TileFlags
+from world.tiles import TILES, FireTile, GreyGooTile, AcidTile, ExplosionTile, SmokeTile
+
+"""
+Structure-of-arrays world backend: every cell of the grid lives in dense NumPy arrays
+instead of being a Tile object, the tile classes are only used to build per-type parameter tables.
+"""
+
+EMPTY = 0
+EMPTY_DENSITY = np.iinfo(np.int32).min
+# heat is exchanged in fixed point, the conductances have HEAT_FRACTION_BITS fractional bits
+HEAT_FRACTION_BITS = 16
+
+
+class Program:
+    """ Defines the movement programs a tile type can run """
+
+    STATIC = 0
+    SEMI_SOLID = 1
+    LIQUID = 2
+    GAS = 3
+
+
+# For each movement program two mirrored direction lists (left first / right first), padded to 5 entries.
+# (0, 0) marks an unused slot.
+_NO_DIR = 0, 0
+_DIRECTIONS = np.array(
+    (
+        (_NO_DIR,) * 5,
+        (_NO_DIR,) * 5,
+        (Dir.DOWN, Dir.DOWN_LEFT, Dir.DOWN_RIGHT, _NO_DIR, _NO_DIR),
+        (Dir.DOWN, Dir.DOWN_LEFT, Dir.DOWN_RIGHT, _NO_DIR, _NO_DIR),
+        LiquidTile.DIRECTIONS[0],
+        LiquidTile.DIRECTIONS[1],
+        GasTile.DIRECTIONS[0],
+        GasTile.DIRECTIONS[1],
+    ),
+    dtype=np.int64
+)
+_DIRECTIONS_X = _DIRECTIONS[:, :, 0]
+_DIRECTIONS_Y = _DIRECTIONS[:, :, 1]
+
+# per-cell custom state of the custom tiles, sampled from the attributes their constructors set
+_STATE_ATTRIBUTES: Dict[Type[Tile], str] = {FireTile: "duration", ExplosionTile: "range"}
+_COOLDOWN_ATTRIBUTES: Dict[Type[Tile], str] = {ExplosionTile: "tile_duration"}
+
+
+class _SamplingWorld:
+    """ Stands in for the world when the tile classes are instantiated to be sampled """
+
+    def __init__(self, random: RandomStream):
+        self.random = random
+
+
+class TileTable:
+    """ Compiles the tile classes down to per-type parameter tables, type id 0 is the empty cell """
+
+    PALETTE_SIZE = 16
+    NO_THRESHOLD = np.iinfo(np.int32).max
+    NO_CONDUCTANCE = -1 << 24
+
+    def __init__(self, tile_types: Iterable[Type[Tile]], random: RandomStream or None = None):
+        # the tile constructors only need the random numbers of a world
+        self._sampling_world = _SamplingWorld(random or RandomStream())
+        self.types: List[Type[Tile] or None] = [None, *tile_types]
+        self.ids: Dict[Type[Tile], int] = {
+            tile_type: i for i, tile_type in enumerate(self.types) if tile_type
+        }
+        size = len(self.types)
+        self.density = np.full(size, EMPTY_DENSITY, np.int32)
+        self.program = np.zeros(size, np.uint8)
+        self.movable = np.zeros(size, bool)
+        self.has_heat = np.zeros(size, bool)
+        # conductance * HEAT_RATE of ArrayHeatSystem in fixed point, the types without heat get a negative
+        # one so that the sum of the conductances of their pairs is never positive
+        self.conductance = np.full(size, self.NO_CONDUCTANCE, np.int32)
+        self.passive_heat_loss = np.zeros(size, np.int32)
+        # thresholds, the target is -1 when the type has no threshold and EMPTY when the tile just disappears
+        self.upper_heat = np.full(size, self.NO_THRESHOLD, np.int32)
+        self.upper_type = np.full(size, -1, np.int16)
+        self.lower_heat = np.full(size, -self.NO_THRESHOLD, np.int32)
+        self.lower_type = np.full(size, -1, np.int16)
+        # per palette entry values
+        self.palette = np.zeros((size, self.PALETTE_SIZE, 3), np.uint8)
+        self.base_heat = np.zeros((size, self.PALETTE_SIZE), np.int32)
+        self.state = np.zeros((size, self.PALETTE_SIZE), np.int32)
+        self.cooldown = np.zeros((size, self.PALETTE_SIZE), np.uint8)
+        for type_id, tile_type in enumerate(self.types):
+            if tile_type:
+                self._compile(type_id, tile_type)
+
+    def _compile(self, type_id: int, tile_type: Type[Tile]):
+        samples: List[Tile] = [tile_type(self._sampling_world, 0, 0) for _ in range(self.PALETTE_SIZE)]
+        self.density[type_id] = tile_type.DENSITY
+        if issubclass(tile_type, SemiSolidTile):
+            self.program[type_id] = Program.SEMI_SOLID
+        elif issubclass(tile_type, LiquidTile):
+            self.program[type_id] = Program.LIQUID
+        elif issubclass(tile_type, GasTile):
+            self.program[type_id] = Program.GAS
+        self.movable[type_id] = self.program[type_id] != Program.STATIC
+        if tile_type.FLAGS & TileFlags.HEAT:
+            self.has_heat[type_id] = True
+            self.conductance[type_id] = round(
+                tile_type.HEAT_TRANSFER_COEFFICIENT * ArrayHeatSystem.HEAT_RATE * (1 << HEAT_FRACTION_BITS)
+            )
+            self.passive_heat_loss[type_id] = tile_type.PASSIVE_HEATH_LOSS
+            if tile_type.UPPER_HEATH_THRESHOLD:
+                self.upper_heat[type_id] = tile_type.UPPER_HEATH_THRESHOLD[0]
+                self.upper_type[type_id] = self.get_id(tile_type.UPPER_HEATH_THRESHOLD[1])
+            if tile_type.LOWER_HEATH_THRESHOLD:
+                self.lower_heat[type_id] = tile_type.LOWER_HEATH_THRESHOLD[0]
+                self.lower_type[type_id] = self.get_id(tile_type.LOWER_HEATH_THRESHOLD[1])
+        for i, sample in enumerate(samples):
+            self.palette[type_id, i] = sample.color
+            if tile_type.FLAGS & TileFlags.HEAT:
+                self.base_heat[type_id, i] = sample.heat
+            if tile_type in _STATE_ATTRIBUTES:
+                self.state[type_id, i] = getattr(sample, _STATE_ATTRIBUTES[tile_type])
+            if tile_type in _COOLDOWN_ATTRIBUTES:
+                self.cooldown[type_id, i] = getattr(sample, _COOLDOWN_ATTRIBUTES[tile_type])
+
+    def get_id(self, tile_type: Type[Tile] or None) -> int:
+        """ returns the type id of the given tile class, EMPTY for None """
+        if tile_type is None:
+            return EMPTY
+        return self.ids[tile_type]
+
+
+MAX_UPDATE_SKIP = 3
+
+
+def move_cells(
+        cells: "CellArrays",
+        table: "TileTable",
+        tick: int,
+        rng: np.random.Generator,
+        area: Tuple[slice, slice] or None = None
+):
+    """
+    Runs one movement step for the cells in the given area (the whole grid if None).
+    Moves can end up one cell outside of the area.
+    """
+    width = cells.width
+    if area is None:
+        area = slice(0, cells.height), slice(0, width)
+    types = cells.type[area]
+    cooldown = cells.cooldown[area]
+    last_update = cells.last_update[area]
+    # pick the cells that can try to move this tick, the others just cool down
+    movable = table.movable[types]
+    not_updated = last_update != tick
+    candidates = movable & (cooldown == 0) & not_updated
+    np.subtract(cooldown, 1, out=cooldown, where=movable & (cooldown != 0) & not_updated)
+    local = np.flatnonzero(candidates)
+    if local.size == 0:
+        return
+    program_types = types.reshape(-1)[local] if types.flags.c_contiguous else types[candidates]
+    src_y = local // candidates.shape[1]
+    src_x = local - src_y * candidates.shape[1]
+    src_y += area[0].start
+    src_x += area[1].start
+    src = src_y * width + src_x
+    density = cells.density.reshape(-1)
+    skip = cells.skip.reshape(-1)
+    # every candidate picks the first valid direction of its program
+    programs = table.program[program_types].astype(np.int64) * 2 + rng.integers(0, 2, src.size)
+    src_density = density[src]
+    dst = np.full(src.size, -1, np.int64)
+    for step in range(_DIRECTIONS.shape[1]):
+        dir_x = _DIRECTIONS_X[programs, step]
+        dir_y = _DIRECTIONS_Y[programs, step]
+        next_x = src_x + dir_x
+        next_y = src_y + dir_y
+        valid = (dst < 0) & ((dir_x != 0) | (dir_y != 0))
+        valid &= (next_x >= 0) & (next_x < width) & (next_y >= 0) & (next_y < cells.height)
+        target = np.where(valid, next_y * width + next_x, 0)
+        valid &= density[target] < src_density
+        dst[valid] = target[valid]
+    moved = dst >= 0
+    failed = src[~moved]
+    # the failed tiles wait longer and longer before trying again
+    skip[failed] = np.minimum(skip[failed] + 1, MAX_UPDATE_SKIP)
+    cells.cooldown.reshape(-1)[failed] = skip[failed]
+    move_src = src[moved]
+    move_dst = dst[moved]
+    # drop conflicting moves: two tiles aiming at the same cell or a target that is moving away itself
+    keep = np.zeros(move_src.size, bool)
+    keep[np.unique(move_dst, return_index=True)[1]] = True
+    keep &= ~np.isin(move_dst, move_src)
+    move_src = move_src[keep]
+    move_dst = move_dst[keep]
+    cells.swap_cells(move_src, move_dst)
+    skip[move_dst] = 0
+    last_update = cells.last_update.reshape(-1)
+    last_update[move_src] = tick
+    last_update[move_dst] = tick
+
+
+class ArrayMovementSystem(GenericSystem):
+
+    NAME = "Movement System"
+
+    def update(self):
+        world: ArrayWorld = self.world
+        move_cells(world, world.table, world.update_count, world.rng)
+
+
+class ArrayHeatSystem(GenericSystem):
+    """
+    Computes one diffusion step of the grid as array operations.
+    Every pair of adjacent heat cells exchanges (heat difference) * (sum of the two conductances) * HEAT_RATE,
+    HEAT_RATE is the biggest step that stays stable with 8 neighbours per cell.
+    The grid is updated by blocks: a block whose heat didn't change in the last step is skipped until a cell
+    in it or around it changes
+    """
+
+    NAME = "Heath System"
+    SHED_LEVEL = 1
+
+    HEAT_RATE = 1 / 16
+    BLOCK_SIZE = 64
+    # each adjacency is visited once, from the cell on the left / above
+    _PAIR_DIRECTIONS = (Dir.RIGHT, Dir.DOWN_LEFT, Dir.DOWN, Dir.DOWN_RIGHT)
+
+    def __init__(self, world: "ArrayWorld"):
+        super().__init__(world)
+        # the types and heat the last step started from, None before the first one
+        self.last_type: np.ndarray or None = None
+        self.last_heat: np.ndarray or None = None
+        # blocks whose heat changed in the last step
+        self.busy_blocks: np.ndarray or None = None
+
+    def update(self):
+        world: ArrayWorld = self.world
+        table = world.table
+        size = self.BLOCK_SIZE
+        block_rows = np.arange(0, world.height, size)
+        block_columns = np.arange(0, world.width, size)
+        if self.last_type is None:
+            stale = np.ones((block_rows.size, block_columns.size), bool)
+            self.last_type = world.type.copy()
+            self.last_heat = world.heat.copy()
+        else:
+            changed = world.type != self.last_type
+            changed |= world.heat != self.last_heat
+            changed = np.logical_or.reduceat(changed, block_rows)
+            changed = np.logical_or.reduceat(changed, block_columns, axis=1)
+            # the pairs of the cells of a block reach one cell into the blocks around it
+            stale = world.dilate(changed) | changed | self.busy_blocks
+            np.copyto(self.last_type, world.type)
+            np.copyto(self.last_heat, world.heat)
+        busy = np.zeros_like(stale)
+        transitions = []
+        for block_row, first_row in enumerate(block_rows.tolist()):
+            last_row = min(first_row + size, world.height)
+            edges = np.flatnonzero(np.diff(stale[block_row], prepend=False, append=False))
+            for first_block, last_block in zip(edges[::2].tolist(), edges[1::2].tolist()):
+                first_column = first_block * size
+                last_column = min(last_block * size, world.width)
+                # the delta of the cells of the run is exact when the pairs one cell around it are counted too
+                outer = (
+                    slice(max(first_row - 1, 0), min(last_row + 1, world.height)),
+                    slice(max(first_column - 1, 0), min(last_column + 1, world.width))
+                )
+                outer_delta = np.zeros(world.heat[outer].shape, np.int32)
+                self.exchange_heat(world, table, outer, outer_delta)
+                delta = outer_delta[
+                    first_row - outer[0].start:last_row - outer[0].start,
+                    first_column - outer[1].start:last_column - outer[1].start
+                ]
+                area = slice(first_row, last_row), slice(first_column, last_column)
+                run_transitions = self.apply_heat(world, table, area, delta)
+                if run_transitions[0].size:
+                    transitions.append(run_transitions)
+                busy[block_row, first_block:last_block] = np.logical_or.reduceat(
+                    (delta != 0).any(axis=0), np.arange(0, last_column - first_column, size)
+                )
+        self.busy_blocks = busy
+        if not transitions:
+            return
+        indices, targets, kept_heat = (np.concatenate(arrays) for arrays in zip(*transitions))
+        order = np.argsort(indices, kind="stable")
+        self.place_transitions(indices[order], targets[order], kept_heat[order])
+
+    @classmethod
+    def exchange_heat(
+            cls,
+            cells: "CellArrays",
+            table: "TileTable",
+            area: Tuple[slice, slice],
+            delta: np.ndarray,
+            owned: np.ndarray or None = None
+    ):
+        """
+        adds to delta, shaped like the area, the heat exchanged by the pairs of adjacent heat cells of the
+        area. If an owned mask is given only the pairs whose first cell is in it are counted, so a part of the
+        grid can exchange with a border of cells around it that another part owns.
+        The exchanges are truncated towards zero like the ones of the tiles, they are computed in int32 so
+        the heat differences have to stay under 2 ** 18
+        """
+        heat = cells.heat[area]
+        conductance = table.conductance.take(cells.type[area])
+        # one buffer for the exchanges and one for the conductances of the pairs, reused by every direction
+        buffers = np.empty((2, heat.size), np.int32)
+        for direction in cls._PAIR_DIRECTIONS:
+            first, second = cls._get_pair_slices(direction, heat.shape)
+            shape = heat[first].shape
+            exchanged = buffers[0, :heat[first].size].reshape(shape)
+            pair_conductance = buffers[1, :heat[first].size].reshape(shape)
+            np.add(conductance[first], conductance[second], out=pair_conductance)
+            # negative if one of the cells has no heat
+            np.maximum(pair_conductance, 0, out=pair_conductance)
+            if owned is not None:
+                pair_conductance *= owned[first]
+            np.subtract(heat[second], heat[first], out=exchanged)
+            exchanged *= pair_conductance
+            # the shift rounds down, the negative exchanges are moved up first to truncate them towards zero
+            np.right_shift(exchanged, 31, out=pair_conductance)
+            pair_conductance &= (1 << HEAT_FRACTION_BITS) - 1
+            exchanged += pair_conductance
+            exchanged >>= HEAT_FRACTION_BITS
+            delta[first] += exchanged
+            delta[second] -= exchanged
+
+    @staticmethod
+    def _get_pair_slices(
+            direction: Tuple[int, int],
+            shape: Tuple[int, int]
+    ) -> Tuple[Tuple[slice, slice], ...]:
+        """ returns the slices of the first and second cell of every pair of cells in the given direction """
+        dx, dy = direction
+        height, width = shape
+        first = slice(max(-dy, 0), height - max(dy, 0)), slice(max(-dx, 0), width - max(dx, 0))
+        second = slice(max(dy, 0), height + min(dy, 0)), slice(max(dx, 0), width + min(dx, 0))
+        return first, second
+
+    @staticmethod
+    def apply_heat(
+            cells: "CellArrays",
+            table: "TileTable",
+            area: Tuple[slice, slice],
+            delta: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        adds the exchanged heat and the passive loss to the cells of the area, returns the cells that crossed
+        one of their thresholds: their flat indices (ascending), the types they turn into and their heat
+        """
+        types = cells.type[area]
+        heat = cells.heat[area]
+        delta -= table.passive_heat_loss.take(types)
+        heat += delta
+        # the types without heat have thresholds no heat reaches
+        upper = heat >= table.upper_heat.take(types)
+        lower = ~upper & (heat <= table.lower_heat.take(types))
+        if not (upper.any() or lower.any()):
+            return np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, heat.dtype)
+        targets = np.where(upper, table.upper_type[types], np.where(lower, table.lower_type[types], -1))
+        y, x = np.nonzero(targets >= 0)
+        indices = (y + area[0].start) * cells.width + x + area[1].start
+        return indices, targets[y, x], heat[y, x]
+
+    def place_transitions(self, indices: np.ndarray, targets: np.ndarray, kept_heat: np.ndarray):
+        """ transforms in bulk the cells that crossed one of their thresholds, the heat is preserved """
+        world: ArrayWorld = self.world
+        for target in np.unique(targets).tolist():
+            selected = targets == target
+            world.place_cells(indices[selected], target)
+            if target != EMPTY:
+                world.heat.reshape(-1)[indices[selected]] = kept_heat[selected]
+
+
+class ArrayCustomTileSystem(GenericSystem):
+
+    NAME = "Custom Tile System"
+    SHED_LEVEL = 2
+
+    def __init__(self, world: "ArrayWorld"):
+        super().__init__(world)
+        self.kernels = tuple(
+            (world.table.ids[tile_type], kernel)
+            for tile_type, kernel in (
+                (FireTile, self.update_fire),
+                (GreyGooTile, self.update_grey_goo),
+                (AcidTile, self.update_acid),
+                (ExplosionTile, self.update_explosions),
+            )
+            if tile_type in world.table.ids
+        )
+
+    def update(self):
+        types = self.world.type.reshape(-1)
+        for type_id, kernel in self.kernels:
+            cells = np.flatnonzero(types == type_id)
+            if cells.size != 0:
+                kernel(type_id, cells)
+
+    def update_fire(self, type_id: int, cells: np.ndarray):
+        world: ArrayWorld = self.world
+        types = world.type.reshape(-1)
+        heat = world.heat.reshape(-1)
+        state = world.state.reshape(-1)
+        last_update = world.last_update.reshape(-1)
+        has_heat = world.table.has_heat
+        choices = world.rng.integers(0, len(FireTile.DIRECTIONS), cells.size)
+        for index, choice in zip(cells.tolist(), choices.tolist()):
+            # a fire that already moved this tick could have taken the place of another one
+            if types[index] != type_id or last_update[index] == world.update_count:
+                continue
+            y, x = divmod(index, world.width)
+            for direction in FireTile.DIRECTIONS[choice]:
+                next_index = world.get_index(x + direction[0], y + direction[1])
+                if next_index < 0:
+                    continue
+                checked_type = types[next_index]
+                if checked_type == EMPTY:
+                    world.move_cell(index, next_index)
+                    index = next_index
+                    break
+                elif has_heat[checked_type]:
+                    heat[next_index] += 100
+                    state[index] -= 50
+                    break
+            last_update[index] = world.update_count
+            state[index] -= 1
+            if state[index] <= 0:
+                world.clear_cells(index)
+
+    def update_grey_goo(self, type_id: int, cells: np.ndarray):
+        world: ArrayWorld = self.world
+        goo = world.type == type_id
+        reached = world.dilate(goo) & (world.type != EMPTY) & ~goo
+        world.place_cells(np.flatnonzero(reached), type_id)
+
+    def update_acid(self, type_id: int, cells: np.ndarray):
+        world: ArrayWorld = self.world
+        types = world.type.reshape(-1)
+        cells = cells[world.rng.integers(0, 20, cells.size) == 0]
+        for index in cells.tolist():
+            if types[index] != type_id:
+                continue
+            y, x = divmod(index, world.width)
+            for direction in Dir.ALL:
+                next_index = world.get_index(x + direction[0], y + direction[1])
+                if next_index < 0:
+                    continue
+                checked_type = types[next_index]
+                if checked_type != EMPTY and checked_type != type_id:
+                    world.clear_cells(next_index)
+                    world.clear_cells(index)
+                    break
+
+    def update_explosions(self, type_id: int, cells: np.ndarray):
+        world: ArrayWorld = self.world
+        types = world.type.reshape(-1)
+        state = world.state.reshape(-1)
+        cooldown = world.cooldown.reshape(-1)
+        smoke_id = world.table.ids.get(SmokeTile, EMPTY)
+        for index in cells.tolist():
+            if cooldown[index] != 0:
+                cooldown[index] -= 1
+                continue
+            explosion_range = state[index]
+            if explosion_range != 0:
+                y, x = divmod(index, world.width)
+                for direction in (Dir.UP, Dir.LEFT, Dir.RIGHT, Dir.DOWN):
+                    next_index = world.get_index(x + direction[0], y + direction[1])
+                    if next_index < 0:
+                        continue
+                    checked_type = types[next_index]
+                    if checked_type == EMPTY:
+                        world.place_cells(next_index, type_id)
+                        state[next_index] = explosion_range - 1
+                    elif checked_type != type_id:
+                        world.clear_cells(next_index)
+                world.clear_cells(index)
+            else:
+                world.place_cells(index, smoke_id)
+
+
+class CellArrays:
+    """ The per-cell arrays of a grid and the operations that move cells around """
+
+    # name, type and value of an empty cell of every cell array
+    FIELDS: Tuple[Tuple[str, type, int], ...] = (
+        ("type", np.uint8, EMPTY),
+        ("heat", np.int32, 0),
+        ("density", np.int32, EMPTY_DENSITY),
+        ("color", np.uint8, 0),
+        ("last_update", np.int64, -1),
+        ("cooldown", np.uint8, 0),
+        ("skip", np.uint8, 0),
+        ("state", np.int32, 0),
+    )
+
+    type: np.ndarray
+    heat: np.ndarray
+    density: np.ndarray
+    color: np.ndarray
+    last_update: np.ndarray
+    cooldown: np.ndarray
+    skip: np.ndarray
+    state: np.ndarray
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        cell_arrays = []
+        for name, dtype, empty_value in self.FIELDS:
+            array = self._allocate(name, (height, width), dtype, empty_value)
+            setattr(self, name, array)
+            cell_arrays.append(array)
+        self.cell_arrays: Tuple[np.ndarray, ...] = tuple(cell_arrays)
+
+    def _allocate(self, name: str, shape: Tuple[int, int], dtype: type, empty_value: int) -> np.ndarray:
+        """ returns the cell array with the given name, filled with empty cells """
+        return np.full(shape, empty_value, dtype)
+
+    # all indices are flat indices in the (height, width) grid
+
+    def get_index(self, x: int, y: int) -> int:
+        """ returns the flat index of the given position, -1 if it's outside the grid """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return -1
+
+    def clear_cells(self, indices: np.ndarray or int):
+        for array, (_, _, empty_value) in zip(self.cell_arrays, self.FIELDS):
+            array.reshape(-1)[indices] = empty_value
+
+    def swap_cells(self, first: np.ndarray, second: np.ndarray):
+        """ swaps the content of the given cells, the two index sets must be disjoint """
+        for array in self.cell_arrays:
+            flat = array.reshape(-1)
+            flat[first], flat[second] = flat[second], flat[first]
+
+    def move_cell(self, index: int, new_index: int):
+        """ moves the content of a cell to another cell, leaving the old one empty """
+        for array in self.cell_arrays:
+            flat = array.reshape(-1)
+            flat[new_index] = flat[index]
+        self.clear_cells(index)
+
+
+class ArrayWorld(CellArrays):
+    """
+    World backend that stores the grid as dense NumPy arrays (structure of arrays).
+    Exposes the same add_tile / delete_tile / update surface as World.
+    """
+
+    def __init__(
+            self,
+            width: int,
+            height: int,
+            tile_types: Iterable[Type[Tile]] = TILES,
+            seed: int or None = None
+    ):
+        super().__init__(width, height)
+        self.random = RandomStream(seed)
+        self.seed = self.random.seed
+        self.rng = self.random.generator
+        self.table = TileTable(tile_types, self.random.spawn(0))
+        print(f"world size: x {width}, y {height}")
+        # init systems
+        self.systems: Iterable[GenericSystem] = (
+            ArrayMovementSystem(self),
+            ArrayHeatSystem(self),
+            ArrayCustomTileSystem(self)
+        )
+        # set to instrument the updates, only the phases are timed
+        self.profiler: Profiler or None = None
+        # raised under load to run the costly systems every other tick, see GenericSystem.SHED_LEVEL
+        self.load_level: int = 0
+        self.update_count: int = 0
+
+    def place_cells(self, indices: np.ndarray or int, type_id: int):
+        """ initializes the given cells as new tiles of the given type """
+        if type_id == EMPTY:
+            self.clear_cells(indices)
+            return
+        table = self.table
+        colors = self.rng.integers(0, table.PALETTE_SIZE, np.shape(indices))
+        self.type.reshape(-1)[indices] = type_id
+        self.color.reshape(-1)[indices] = colors
+        self.heat.reshape(-1)[indices] = table.base_heat[type_id, colors]
+        self.density.reshape(-1)[indices] = table.density[type_id]
+        self.last_update.reshape(-1)[indices] = -1
+        self.cooldown.reshape(-1)[indices] = table.cooldown[type_id, colors]
+        self.skip.reshape(-1)[indices] = 0
+        self.state.reshape(-1)[indices] = table.state[type_id, colors]
+
+    @staticmethod
+    def dilate(mask: np.ndarray) -> np.ndarray:
+        """ returns the cells that have at least one neighbour in the given mask, of any shape """
+        height, width = mask.shape
+        result = np.zeros_like(mask)
+        for direction in Dir.ALL:
+            dx, dy = direction
+            result[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] |= \
+                mask[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+        return result
+
+    # World interface
+
+    def add_tile(self, tile_type: Type[Tile], x: int, y: int) -> bool:
+        """ adds a tile at the given position if the cell is free, returns True if the tile was added """
+        index = self.get_index(x, y)
+        if index < 0 or self.type.reshape(-1)[index] != EMPTY:
+            return False
+        self.place_cells(index, self.table.ids[tile_type])
+        return True
+
+    def delete_tile(self, x: int, y: int) -> Type[Tile] or None:
+        """ Removes the tile at the given position and returns its type """
+        index = self.get_index(x, y)
+        if index < 0:
+            return None
+        tile_type = self.table.types[self.type.reshape(-1)[index]]
+        if tile_type:
+            self.clear_cells(index)
+        return tile_type
+
+    def get_region_indices(self, positions: Iterable[Tuple[int, int]]) -> np.ndarray:
+        """ returns the flat indices of the given positions inside the world, in the same order """
+        positions = np.array(list(positions), np.int64).reshape(-1, 2)
+        xs = positions[:, 0]
+        ys = positions[:, 1]
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        return ys[inside] * self.width + xs[inside]
+
+    def fill_region(self, tile_type: Type[Tile], positions: Iterable[Tuple[int, int]]) -> int:
+        """
+        adds tiles of the given type on the free cells among the given positions (see world.brush),
+        the positions outside the world are skipped. Returns the number of tiles added
+        """
+        indices = self.get_region_indices(positions)
+        indices = indices[self.type.reshape(-1)[indices] == EMPTY]
+        self.place_cells(indices, self.table.ids[tile_type])
+        return len(indices)
+
+    def clear_region(self, positions: Iterable[Tuple[int, int]]) -> int:
+        """ removes the tiles at the given positions (see world.brush), returns the number removed """
+        indices = self.get_region_indices(positions)
+        indices = indices[self.type.reshape(-1)[indices] != EMPTY]
+        self.clear_cells(indices)
+        return len(indices)
+
+    def inspect(self, x: int, y: int) -> Tuple[str, int or None] or None:
+        """ returns the name and the heat (None if the tile has no heat) of the tile at the given position """
+        if self.get_index(x, y) < 0:
+            return None
+        type_id = self.type[y, x]
+        if type_id == EMPTY:
+            return None
+        return self.table.types[type_id].NAME, int(self.heat[y, x]) if self.table.has_heat[type_id] else None
+
+    @property
+    def tile_count(self) -> int:
+        return int(np.count_nonzero(self.type))
+
+    def get_colors(self) -> np.ndarray:
+        """ returns the (height, width, 3) RGB image of the world """
+        return self.table.palette[self.type, self.color]
+
+    def update(self):
+        systems = [system for system in self.systems if system.is_due(self.update_count, self.load_level)]
+        if self.profiler:
+            self.profiler.begin_tick(self.update_count)
+            for system in systems:
+                self.profiler.run(system.NAME, system.update)
+            self.profiler.end_tick()
+        else:
+            for system in systems:
+                system.update()
+        self.update_count += 1
+
+    def close(self):
+        """ releases the resources held by the world """
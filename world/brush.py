@@ -0,0 +1,55 @@
+from typing import List, Tuple, Dict
+
+"""
+Shapes painted by the brush, as lists of cell positions for World.fill_region / clear_region.
+The positions aren't clipped to any world (the worlds skip the ones outside) and are sorted row by row,
+so painting the same shape always creates its tiles in the same order.
+"""
+
+Position = Tuple[int, int]
+
+_DISC_OFFSETS: Dict[int, List[Position]] = {}
+
+
+def get_disc_offsets(radius: int) -> List[Position]:
+    """ returns the offsets of the cells of a disc, radius 0 is a single cell and radius 1 the 3x3 square """
+    if radius not in _DISC_OFFSETS:
+        # r * (r + 1) instead of r * r gives rounder small discs
+        _DISC_OFFSETS[radius] = [
+            (dx, dy)
+            for dy in range(-radius, radius + 1)
+            for dx in range(-radius, radius + 1)
+            if dx * dx + dy * dy <= radius * (radius + 1)
+        ]
+    return _DISC_OFFSETS[radius]
+
+
+def get_circle(center_x: int, center_y: int, radius: int) -> List[Position]:
+    return [(center_x + dx, center_y + dy) for dx, dy in get_disc_offsets(radius)]
+
+
+def get_rect(min_x: int, min_y: int, max_x: int, max_y: int) -> List[Position]:
+    """ returns the cells of the given rect, max excluded """
+    return [(x, y) for y in range(min_y, max_y) for x in range(min_x, max_x)]
+
+
+def get_line(start_x: int, start_y: int, end_x: int, end_y: int) -> List[Position]:
+    """ returns the cells of the segment between the two points, both included, without gaps """
+    steps = max(abs(end_x - start_x), abs(end_y - start_y))
+    if not steps:
+        return [(start_x, start_y)]
+    return [
+        (start_x + round((end_x - start_x) * i / steps), start_y + round((end_y - start_y) * i / steps))
+        for i in range(steps + 1)
+    ]
+
+
+def get_stroke(start_x: int, start_y: int, end_x: int, end_y: int, radius: int) -> List[Position]:
+    """ returns the cells swept by a disc moving from the start point to the end point """
+    offsets = get_disc_offsets(radius)
+    cells = {
+        (x + dx, y + dy)
+        for x, y in get_line(start_x, start_y, end_x, end_y)
+        for dx, dy in offsets
+    }
+    return sorted(cells, key=lambda position: (position[1], position[0]))
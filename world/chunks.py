@@ -0,0 +1,146 @@
+from typing import List, Tuple, Dict
+
+"""
+Chunk bookkeeping: the world is split in fixed-size chunks that remember which cells changed,
+the systems only visit the dirty part of the awake chunks.
+"""
+
+
+def _merge_rect(rect: List[int], other: List[int]):
+    """ grows rect to cover other too """
+    if other[0] < rect[0]:
+        rect[0] = other[0]
+    if other[1] < rect[1]:
+        rect[1] = other[1]
+    if other[2] > rect[2]:
+        rect[2] = other[2]
+    if other[3] > rect[3]:
+        rect[3] = other[3]
+
+
+class Chunk:
+    """ A square of the world, tracks the rect of cells that have to be updated next tick """
+
+    def __init__(self, min_x: int, min_y: int, max_x: int, max_y: int):
+        # bounds of the chunk, inclusive
+        self.min_x = min_x
+        self.min_y = min_y
+        self.max_x = max_x
+        self.max_y = max_y
+        # [min_x, min_y, max_x, max_y] of the cells to update next tick, None if the chunk goes to sleep
+        self.dirty_rect: List[int] or None = None
+        # rect being updated this tick
+        self.rect: List[int] or None = None
+
+    def mark(self, min_x: int, min_y: int, max_x: int, max_y: int) -> bool:
+        """ adds the given rect (clamped to the chunk) to the dirty rect, returns True if it was asleep """
+        if min_x < self.min_x:
+            min_x = self.min_x
+        if min_y < self.min_y:
+            min_y = self.min_y
+        if max_x > self.max_x:
+            max_x = self.max_x
+        if max_y > self.max_y:
+            max_y = self.max_y
+        rect = self.dirty_rect
+        if rect is None:
+            self.dirty_rect = [min_x, min_y, max_x, max_y]
+            return True
+        if min_x < rect[0]:
+            rect[0] = min_x
+        if min_y < rect[1]:
+            rect[1] = min_y
+        if max_x > rect[2]:
+            rect[2] = max_x
+        if max_y > rect[3]:
+            rect[3] = max_y
+        return False
+
+
+class ChunkGrid:
+    """ Splits the world in chunks of size x size cells """
+
+    def __init__(self, width: int, height: int, size: int = 32):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.chunks: Tuple[Tuple[Chunk, ...], ...] = tuple(
+            tuple(
+                Chunk(x, y, min(x + size, width) - 1, min(y + size, height) - 1)
+                for x in range(0, width, size)
+            )
+            for y in range(0, height, size)
+        )
+        # chunks that have a dirty rect for the next tick
+        self.dirty_chunks: List[Chunk] = []
+        # chunks being updated this tick
+        self.awake_chunks: List[Chunk] = []
+
+    def mark_dirty(self, x: int, y: int):
+        """ wakes up the cell at the given position and its neighbours, even if they are in another chunk """
+        min_x = x - 1 if x else 0
+        min_y = y - 1 if y else 0
+        max_x = x + 1 if x + 1 < self.width else x
+        max_y = y + 1 if y + 1 < self.height else y
+        size = self.size
+        first_chunk_x = min_x // size
+        last_chunk_x = max_x // size
+        first_chunk_y = min_y // size
+        last_chunk_y = max_y // size
+        for chunk_y in range(first_chunk_y, last_chunk_y + 1):
+            row = self.chunks[chunk_y]
+            for chunk_x in range(first_chunk_x, last_chunk_x + 1):
+                chunk = row[chunk_x]
+                if chunk.mark(min_x, min_y, max_x, max_y):
+                    self.dirty_chunks.append(chunk)
+
+    def begin_tick(self):
+        """ the dirty rects become the rects to update this tick """
+        for chunk in self.awake_chunks:
+            chunk.rect = None
+        for chunk in self.dirty_chunks:
+            chunk.rect = chunk.dirty_rect
+            chunk.dirty_rect = None
+        self.awake_chunks = self.dirty_chunks
+        self.dirty_chunks = []
+
+    def defer(self, missed_rects: Dict[Chunk, List[int]]):
+        """ adds the rects to update this tick to the given ones, for a system that skips the tick """
+        for chunk in self.awake_chunks:
+            rect = missed_rects.get(chunk)
+            if rect is None:
+                missed_rects[chunk] = list(chunk.rect)
+            else:
+                _merge_rect(rect, chunk.rect)
+
+    def collect_tiles(
+            self,
+            cells: List,
+            stride: int,
+            flag: int,
+            missed_rects: Dict[Chunk, List[int]] or None = None
+    ) -> list:
+        """
+        returns the tiles with the given component flag in the awake rects, bottom rows first.
+        cells is the flat grid of the world, with a one cell border: (x, y) is at (y + 1) * stride + x + 1.
+        The missed rects of a system (see defer) are visited too, and cleared
+        """
+        if missed_rects:
+            for chunk in self.awake_chunks:
+                rect = missed_rects.get(chunk)
+                if rect is None:
+                    missed_rects[chunk] = chunk.rect
+                else:
+                    _merge_rect(rect, chunk.rect)
+            rects = list(missed_rects.values())
+            missed_rects.clear()
+        else:
+            rects = [chunk.rect for chunk in self.awake_chunks]
+        tiles = []
+        for min_x, min_y, max_x, max_y in rects:
+            for y in range(max_y, min_y - 1, -1):
+                start = (y + 1) * stride + 1
+                for tile in cells[start + min_x:start + max_x + 1]:
+                    if tile and (tile.FLAGS & flag):
+                        tiles.append(tile)
+        return tiles
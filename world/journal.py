@@ -0,0 +1,37 @@
+from typing import List, Set
+
+"""
+Change journal: records the cells written to the world so consumers (e.g. the renderer) can work on diffs.
+"""
+
+
+class ChangeJournal:
+    """
+    Every consumer subscribes and gets its own set of changed cells (flat indices, y * width + x),
+    filled by the world until the consumer drains it.
+    Draining a reader once per tick gives the cells changed by that tick.
+    """
+
+    def __init__(self):
+        self._readers: List[Set[int]] = []
+
+    def subscribe(self) -> Set[int]:
+        """ returns a new set that from now on collects every changed cell, the consumer clears it """
+        reader: Set[int] = set()
+        self._readers.append(reader)
+        return reader
+
+    def unsubscribe(self, reader: Set[int]):
+        self._readers.remove(reader)
+
+    def record(self, index: int):
+        for reader in self._readers:
+            reader.add(index)
+
+    def record_all(self, indices: Set[int] or range):
+        for reader in self._readers:
+            reader.update(indices)
+
+    @property
+    def active(self) -> bool:
+        return bool(self._readers)
@@ -0,0 +1,223 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+from typing import Dict, List, Tuple, Iterable, Type
+
+import numpy as np
+
+from world.array_world import (
+    ArrayWorld, CellArrays, TileTable, move_cells, ArrayMovementSystem, ArrayHeatSystem
+)
+from world.semirandom import RandomStream
+from world.world import Tile
+from world.tiles import TILES
+
+"""
+Multi-core update of the array world: the cell arrays live in shared memory and the movement and heat steps
+run on a process pool, one checkerboard phase at a time so no two workers ever touch adjacent chunks.
+"""
+
+# (chunk index, first row, last row + 1, first column, last column + 1)
+ChunkArea = Tuple[int, int, int, int, int]
+
+
+def _shared_array(
+        shape: Tuple[int, int],
+        dtype: type,
+        block_name: str or None = None
+) -> Tuple[SharedMemory, np.ndarray]:
+    """ creates a new shared memory block for the array, or attaches to an existing one if a name is given """
+    if block_name:
+        block = SharedMemory(block_name)
+    else:
+        block = SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return block, np.ndarray(shape, dtype, buffer=block.buf)
+
+
+# worker side -------------------------------
+
+
+class SharedCellArrays(CellArrays):
+    """ Cell arrays attached to the shared memory blocks of a ParallelArrayWorld """
+
+    def __init__(self, width: int, height: int, block_names: Dict[str, str]):
+        self.block_names = block_names
+        self.blocks: List[SharedMemory] = []
+        super().__init__(width, height)
+
+    def _allocate(self, name: str, shape: Tuple[int, int], dtype: type, empty_value: int) -> np.ndarray:
+        block, array = _shared_array(shape, dtype, self.block_names[name])
+        self.blocks.append(block)
+        return array
+
+
+_worker_cells: SharedCellArrays or None = None
+_worker_table: TileTable or None = None
+_worker_heat_delta: np.ndarray or None = None
+_worker_blocks: List[SharedMemory] = []
+
+
+def _init_worker(width: int, height: int, block_names: Dict[str, str], tile_types: List[Type[Tile]]):
+    global _worker_cells, _worker_table, _worker_heat_delta
+    _worker_cells = SharedCellArrays(width, height, block_names)
+    _worker_table = TileTable(tile_types)
+    block, _worker_heat_delta = _shared_array((height, width), np.int32, block_names["heat_delta"])
+    _worker_blocks.append(block)
+
+
+def _move_chunks(chunks: List[ChunkArea], tick: int, seed: int):
+    random = RandomStream(seed)
+    for index, first_row, last_row, first_column, last_column in chunks:
+        # every chunk has its own stream so the result doesn't depend on which worker runs it
+        move_cells(
+            _worker_cells,
+            _worker_table,
+            tick,
+            random.spawn(tick, index).generator,
+            (slice(first_row, last_row), slice(first_column, last_column))
+        )
+
+
+def _exchange_chunks_heat(chunks: List[ChunkArea]):
+    """ adds to the shared heat delta the heat exchanged by the pairs of cells that start in the chunks """
+    height, width = _worker_cells.height, _worker_cells.width
+    for _, first_row, last_row, first_column, last_column in chunks:
+        # the pairs reach one cell below and one cell on each side of the chunk
+        first_halo_column = max(first_column - 1, 0)
+        last_halo_column = min(last_column + 1, width)
+        area = slice(first_row, min(last_row + 1, height)), slice(first_halo_column, last_halo_column)
+        if not _worker_table.has_heat[_worker_cells.type[area]].any():
+            continue
+        owned = np.zeros(_worker_heat_delta[area].shape, bool)
+        owned[:last_row - first_row, first_column - first_halo_column:last_column - first_halo_column] = True
+        ArrayHeatSystem.exchange_heat(_worker_cells, _worker_table, area, _worker_heat_delta[area], owned)
+
+
+def _apply_chunks_heat(chunks: List[ChunkArea]) -> Tuple[np.ndarray, np.ndarray, np.ndarray] or None:
+    """ applies the heat delta of the chunks and clears it, returns their transitions (see apply_heat) """
+    transitions = []
+    for _, first_row, last_row, first_column, last_column in chunks:
+        area = slice(first_row, last_row), slice(first_column, last_column)
+        if not _worker_table.has_heat[_worker_cells.type[area]].any():
+            continue
+        delta = _worker_heat_delta[area]
+        chunk_transitions = ArrayHeatSystem.apply_heat(_worker_cells, _worker_table, area, delta)
+        delta.fill(0)
+        if chunk_transitions[0].size:
+            transitions.append(chunk_transitions)
+    if not transitions:
+        return None
+    return tuple(np.concatenate(arrays) for arrays in zip(*transitions))
+
+
+# main process side ------------------------
+
+
+class ParallelMovementSystem(ArrayMovementSystem):
+    """ Runs the movement step one checkerboard phase at a time on the process pool """
+
+    def update(self):
+        world: ParallelArrayWorld = self.world
+        for phase in world.phases:
+            futures = [
+                world.executor.submit(_move_chunks, batch, world.update_count, world.seed)
+                for batch in phase
+            ]
+            for future in futures:
+                future.result()
+
+
+class ParallelHeatSystem(ArrayHeatSystem):
+    """
+    Runs the heat step on the process pool: the pairs of every chunk add their exchanges to a shared delta,
+    one checkerboard phase at a time since they write one cell outside of the chunk, then all the chunks apply
+    their delta at once. The transitions are placed here, in the order of the cells, like ArrayHeatSystem does
+    """
+
+    def update(self):
+        world: ParallelArrayWorld = self.world
+        for phase in world.phases:
+            futures = [world.executor.submit(_exchange_chunks_heat, batch) for batch in phase]
+            for future in futures:
+                future.result()
+        futures = [world.executor.submit(_apply_chunks_heat, batch) for batch in world.batches]
+        transitions = [result for result in (future.result() for future in futures) if result]
+        if not transitions:
+            return
+        indices, targets, kept_heat = (np.concatenate(arrays) for arrays in zip(*transitions))
+        order = np.argsort(indices, kind="stable")
+        self.place_transitions(indices[order], targets[order], kept_heat[order])
+
+
+class ParallelArrayWorld(ArrayWorld):
+    """
+    Array world that updates the movement and the heat of its chunks on multiple processes.
+    The chunks are split in 4 checkerboard phases: chunks of the same phase never touch each other
+    and moves and heat exchanges never reach further than one cell outside of a chunk, so a phase runs
+    without locks.
+    The result only depends on the seed, not on the number of workers.
+    """
+
+    def __init__(
+            self,
+            width: int,
+            height: int,
+            tile_types: Iterable[Type[Tile]] = TILES,
+            seed: int or None = None,
+            workers: int or None = None,
+            chunk_size: int = 128
+    ):
+        tile_types = list(tile_types)
+        self.blocks: Dict[str, SharedMemory] = {}
+        super().__init__(width, height, tile_types, seed)
+        # heat exchanged by every cell during the heat step, zero between two steps
+        self.blocks["heat_delta"], self.heat_delta = _shared_array((height, width), np.int32)
+        self.heat_delta.fill(0)
+        self.workers = workers or cpu_count()
+        self.executor = ProcessPoolExecutor(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(width, height, {name: block.name for name, block in self.blocks.items()}, tile_types)
+        )
+        self.phases: Tuple[List[List[ChunkArea]], ...] = self._build_phases(chunk_size)
+        chunks = [chunk for phase in self.phases for batch in phase for chunk in batch]
+        # all the chunks, one batch per worker
+        self.batches: List[List[ChunkArea]] = self._split(chunks)
+        self.systems = (ParallelMovementSystem(self), ParallelHeatSystem(self), *self.systems[2:])
+
+    def _allocate(self, name: str, shape: Tuple[int, int], dtype: type, empty_value: int) -> np.ndarray:
+        block, array = _shared_array(shape, dtype)
+        self.blocks[name] = block
+        array.fill(empty_value)
+        return array
+
+    def _build_phases(self, chunk_size: int) -> Tuple[List[List[ChunkArea]], ...]:
+        """ returns, for every phase, the chunks of the phase split in one batch per worker """
+        phases: Tuple[List[ChunkArea], ...] = ([], [], [], [])
+        index = 0
+        for chunk_y, first_row in enumerate(range(0, self.height, chunk_size)):
+            for chunk_x, first_column in enumerate(range(0, self.width, chunk_size)):
+                phases[(chunk_x & 1) + ((chunk_y & 1) << 1)].append((
+                    index,
+                    first_row,
+                    min(first_row + chunk_size, self.height),
+                    first_column,
+                    min(first_column + chunk_size, self.width)
+                ))
+                index += 1
+        return tuple(self._split(chunks) for chunks in phases)
+
+    def _split(self, chunks: List[ChunkArea]) -> List[List[ChunkArea]]:
+        """ splits the chunks in one batch per worker """
+        return [batch for batch in (chunks[i::self.workers] for i in range(self.workers)) if batch]
+
+    def close(self):
+        self.executor.shutdown()
+        # drop the views on the blocks before closing them
+        for name, _, _ in self.FIELDS:
+            setattr(self, name, None)
+        self.cell_arrays = ()
+        self.heat_delta = None
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
@@ -0,0 +1,128 @@
+import json
+from collections import Counter, deque
+from time import perf_counter
+from typing import Dict, List, Callable, Deque, Tuple
+
+"""
+Per tick instrumentation of a world: set world.profiler to a Profiler and every update records the time
+of each phase, the tiles each system visited (by type), the moves, swaps and transforms, keeping the last
+ticks for a rolling breakdown and, if asked, a trace in the Chrome trace event format (chrome://tracing,
+Perfetto).
+"""
+
+
+class TickProfile:
+    """ What happened during one tick """
+
+    def __init__(self, tick: int):
+        self.tick = tick
+        # phase name -> seconds, in execution order
+        self.phases: Dict[str, float] = {}
+        # system name -> tiles visited
+        self.visited: Dict[str, int] = {}
+        self.tile_types: Counter = Counter()
+        self.moves: int = 0
+        self.swaps: int = 0
+        self.transforms: int = 0
+
+
+class Profiler:
+    """ Collects the profile of every tick of a world, the last WINDOW ones are kept for rolling averages """
+
+    WINDOW = 60
+
+    def __init__(self, trace: bool = False):
+        self.ticks: Deque[TickProfile] = deque(maxlen=self.WINDOW)
+        self.current: TickProfile or None = None
+        # counters incremented by the tiles during the tick
+        self.moves: int = 0
+        self.swaps: int = 0
+        self.transforms: int = 0
+        self.trace_events: List[Dict] or None = [] if trace else None
+        self._start_time = perf_counter()
+
+    def begin_tick(self, tick: int):
+        self.current = TickProfile(tick)
+        self.moves = 0
+        self.swaps = 0
+        self.transforms = 0
+
+    def run(self, name: str, phase: Callable[[], None]):
+        """ runs a phase of the tick, timing it """
+        start_time = perf_counter()
+        phase()
+        self.add_phase(name, start_time, perf_counter())
+
+    def add_phase(self, name: str, start_time: float, end_time: float):
+        """ records a phase timed outside of the profiler (e.g. the rendering) in the last tick """
+        profile = self.current or (self.ticks[-1] if self.ticks else None)
+        if not profile:
+            return
+        profile.phases[name] = profile.phases.get(name, 0) + end_time - start_time
+        if self.trace_events is not None:
+            self.trace_events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start_time - self._start_time) * 1000000,
+                "dur": (end_time - start_time) * 1000000,
+                "pid": 0,
+                "tid": 0,
+                "args": {"tick": profile.tick},
+            })
+
+    def count_tiles(self, name: str, tiles: List):
+        """ records the tiles a system visited """
+        self.current.visited[name] = len(tiles)
+        self.current.tile_types.update(tile.NAME for tile in tiles)
+
+    def end_tick(self):
+        profile = self.current
+        profile.moves = self.moves
+        profile.swaps = self.swaps
+        profile.transforms = self.transforms
+        self.ticks.append(profile)
+        self.current = None
+        if self.trace_events is not None:
+            self.trace_events.append({
+                "name": "tiles",
+                "ph": "C",
+                "ts": (perf_counter() - self._start_time) * 1000000,
+                "pid": 0,
+                "args": {
+                    "moves": profile.moves,
+                    "swaps": profile.swaps,
+                    "transforms": profile.transforms,
+                    **profile.visited
+                },
+            })
+
+    def get_breakdown(self) -> Tuple[Dict[str, float], Dict[str, float], Counter]:
+        """
+        returns the averages over the last ticks of: the seconds of each phase,
+        the counters (moves, swaps, transforms and tiles visited by each system)
+        and the tiles visited per type
+        """
+        phases: Dict[str, float] = {}
+        counters: Dict[str, float] = {"moves": 0, "swaps": 0, "transforms": 0}
+        tile_types: Counter = Counter()
+        # copied first, the ticks can be appended by the simulation thread meanwhile
+        for profile in list(self.ticks):
+            for name, seconds in profile.phases.items():
+                phases[name] = phases.get(name, 0) + seconds
+            counters["moves"] += profile.moves
+            counters["swaps"] += profile.swaps
+            counters["transforms"] += profile.transforms
+            for name, visited in profile.visited.items():
+                counters[name] = counters.get(name, 0) + visited
+            tile_types.update(profile.tile_types)
+        ticks = len(self.ticks) or 1
+        return (
+            {name: seconds / ticks for name, seconds in phases.items()},
+            {name: count / ticks for name, count in counters.items()},
+            Counter({name: count / ticks for name, count in tile_types.items()})
+        )
+
+    def dump(self, path: str):
+        """ writes the trace recorded so far, open it with chrome://tracing or https://ui.perfetto.dev """
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.trace_events or [], "displayTimeUnit": "ms"}, file)
@@ -0,0 +1,139 @@
+import json
+from functools import partial
+from hashlib import sha1
+from typing import List, Dict, Callable, Tuple, Iterator
+
+from world.brush import get_stroke
+from world.world import World
+from world.tiles import TILES
+from world.array_world import ArrayWorld
+from world.parallel import ParallelArrayWorld
+
+"""
+Record / replay of play sessions.
+The game turns its inputs into commands and applies them through a Session, a recording stores the seed
+and the commands of every frame, so applying them again to a world built the same way reproduces the run.
+A recording is a JSON lines file: a header, one list of commands per frame and a footer with the final state.
+"""
+
+VERSION = 2
+
+# ["add", tile index, x, y, from x, from y, brush radius], ["delete", x, y, from x, from y, brush radius],
+# ["select", tile index], ["pause"], ["reset"], ["shed", load level].
+# The brush paints the stroke from the from position to x, y
+Command = list
+
+
+def get_world_type(backend: str, seed: int or None = None, workers: int = 0) -> Callable[[int, int], World]:
+    """ returns the world constructor of the given backend, its worlds draw their random numbers from seed """
+    if backend == "array":
+        return partial(ArrayWorld, seed=seed)
+    if backend == "parallel":
+        return partial(ParallelArrayWorld, seed=seed, workers=workers or None)
+    return partial(World, seed=seed)
+
+
+def get_state_hash(world: World or ArrayWorld) -> str:
+    """ returns a hash of the image of the world, the same for every backend """
+    if isinstance(world, ArrayWorld):
+        return sha1(world.get_colors().tobytes()).hexdigest()
+    return sha1(world.color_buffer).hexdigest()
+
+
+class Session:
+    """ The state the commands act on: the world, the selected tile and the pause """
+
+    def __init__(self, world_type: Callable[[int, int], World], width: int, height: int):
+        self.world_type = world_type
+        self.width = width
+        self.height = height
+        self.world = world_type(width, height)
+        self.selected_tile: int = 0
+        self.paused: bool = False
+        # kept by the new worlds after a reset
+        self.load_level: int = 0
+
+    def apply(self, command: Command):
+        name = command[0]
+        if name == "add":
+            _, tile_index, x, y, from_x, from_y, radius = command
+            self.world.fill_region(TILES[tile_index], get_stroke(from_x, from_y, x, y, radius))
+        elif name == "delete":
+            _, x, y, from_x, from_y, radius = command
+            self.world.clear_region(get_stroke(from_x, from_y, x, y, radius))
+        elif name == "select":
+            self.selected_tile = command[1]
+        elif name == "pause":
+            self.paused = not self.paused
+        elif name == "reset":
+            self.world.close()
+            self.world = self.world_type(self.width, self.height)
+            self.world.load_level = self.load_level
+        elif name == "shed":
+            self.load_level = command[1]
+            self.world.load_level = self.load_level
+        else:
+            raise ValueError(f"unknown command {name}")
+
+    def update(self):
+        if not self.paused:
+            self.world.update()
+
+
+class Recorder:
+    """ Writes the commands of every frame of a session to a recording """
+
+    def __init__(self, path: str, backend: str, seed: int, width: int, height: int):
+        self.file = open(path, "w")
+        self.frames: int = 0
+        self._write({"version": VERSION, "backend": backend, "seed": seed, "width": width, "height": height})
+
+    def _write(self, line: Dict or List):
+        self.file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def record(self, commands: List[Command]):
+        self._write(commands)
+        self.frames += 1
+
+    def close(self, session: Session):
+        """ ends the recording with the state of the world, used to check the replays """
+        self._write({
+            "frames": self.frames,
+            "update_count": session.world.update_count,
+            "tile_count": session.world.tile_count,
+            "hash": get_state_hash(session.world)
+        })
+        self.file.close()
+
+
+class Recording:
+    """ A recorded session, read back from its file """
+
+    def __init__(self, path: str):
+        with open(path) as file:
+            lines = [json.loads(line) for line in file]
+        self.header: Dict = lines[0]
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} recording")
+        # the footer is missing if the game didn't quit properly
+        self.footer: Dict or None = lines[-1] if len(lines) > 1 and isinstance(lines[-1], dict) else None
+        self.frames: List[List[Command]] = lines[1:-1] if self.footer else lines[1:]
+
+    def create_session(self, workers: int = 0) -> Session:
+        """ returns a new session set up like the recorded one """
+        world_type = get_world_type(self.header["backend"], self.header["seed"], workers)
+        return Session(world_type, self.header["width"], self.header["height"])
+
+    def __iter__(self) -> Iterator[List[Command]]:
+        return iter(self.frames)
+
+    def check(self, session: Session) -> Tuple[bool, str]:
+        """ returns whether the session ended like the recorded one, with a description of the difference """
+        if not self.footer:
+            return False, "the recording has no final state"
+        world = session.world
+        state = world.update_count, world.tile_count, get_state_hash(world)
+        recorded = self.footer["update_count"], self.footer["tile_count"], self.footer["hash"]
+        if state != recorded:
+            return False, f"(ticks, tiles, hash) {state} instead of {recorded}"
+        return True, "same final state"
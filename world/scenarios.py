@@ -0,0 +1,98 @@
+from typing import Callable, Dict, Type
+
+from world.world import Tile, World
+from world.tiles import SandTile, WaterTile, LavaTile, IceTile, GunpowderTile, ExplosionTile, GreyGooTile, \
+    ConcreteTile, WoodTile, OilTile, RockTile, VaporTile
+
+"""
+Named scenarios used by the headless benchmark, each one builds a world with the given world type
+"""
+
+Scenario = Callable[[Callable[[int, int], World]], World]
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def add_to_scenarios(scenario: Scenario) -> Scenario:
+    SCENARIOS[scenario.__name__] = scenario
+    return scenario
+
+
+def fill_rect(
+        world: World,
+        tile_type: Type[Tile],
+        min_x: int,
+        min_y: int,
+        max_x: int,
+        max_y: int,
+        step: int = 1
+):
+    """ adds tiles of the given type in the given rect (max excluded), every step cells """
+    for y in range(min_y, max_y, step):
+        for x in range(min_x, max_x, step):
+            world.add_tile(tile_type, x, y)
+
+
+@add_to_scenarios
+def sand_avalanche(world_type: Callable[[int, int], World]) -> World:
+    """ a tall block of sand collapsing on a concrete floor """
+    world = world_type(320, 180)
+    fill_rect(world, ConcreteTile, 0, 175, 320, 180)
+    fill_rect(world, SandTile, 100, 0, 220, 150)
+    return world
+
+
+@add_to_scenarios
+def water_column(world_type: Callable[[int, int], World]) -> World:
+    """ a column of water spreading in a concrete basin """
+    world = world_type(320, 180)
+    fill_rect(world, ConcreteTile, 0, 175, 320, 180)
+    fill_rect(world, ConcreteTile, 0, 100, 5, 175)
+    fill_rect(world, ConcreteTile, 315, 100, 320, 175)
+    fill_rect(world, WaterTile, 140, 0, 180, 170)
+    return world
+
+
+@add_to_scenarios
+def lava_meets_ice(world_type: Callable[[int, int], World]) -> World:
+    """ a lava pool poured over a sheet of ice, lots of heat exchange and state changes """
+    world = world_type(320, 180)
+    fill_rect(world, IceTile, 0, 120, 320, 180)
+    fill_rect(world, LavaTile, 60, 60, 260, 110)
+    return world
+
+
+@add_to_scenarios
+def gunpowder_chain(world_type: Callable[[int, int], World]) -> World:
+    """ a gunpowder field with a few explosions going off in it """
+    world = world_type(320, 180)
+    fill_rect(world, ConcreteTile, 0, 175, 320, 180)
+    fill_rect(world, GunpowderTile, 0, 80, 320, 175, 2)
+    for x in range(20, 320, 60):
+        world.add_tile(ExplosionTile, x, 79)
+    return world
+
+
+@add_to_scenarios
+def grey_goo_outbreak(world_type: Callable[[int, int], World]) -> World:
+    """ grey goo eating its way through a mixed pile """
+    world = world_type(320, 180)
+    fill_rect(world, WoodTile, 0, 140, 320, 180)
+    fill_rect(world, RockTile, 0, 100, 320, 140)
+    fill_rect(world, SandTile, 0, 60, 320, 100)
+    world.add_tile(GreyGooTile, 160, 59)
+    return world
+
+
+@add_to_scenarios
+def mixed_megacell(world_type: Callable[[int, int], World]) -> World:
+    """ a 1000x1000 world with a bit of everything """
+    world = world_type(1000, 1000)
+    fill_rect(world, ConcreteTile, 0, 990, 1000, 1000)
+    fill_rect(world, SandTile, 0, 0, 250, 600)
+    fill_rect(world, WaterTile, 250, 0, 500, 600)
+    fill_rect(world, OilTile, 500, 300, 750, 600)
+    fill_rect(world, IceTile, 750, 700, 1000, 990)
+    fill_rect(world, LavaTile, 750, 400, 1000, 500)
+    fill_rect(world, VaporTile, 0, 800, 500, 900, 2)
+    return world
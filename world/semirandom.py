@@ -1,5 +1,8 @@
 import random
 from time import time
+from typing import List, Tuple
+
+import numpy as np
 
 _NUMBERS = [*range(1024)]
 random.shuffle(_NUMBERS)
@@ -23,6 +26,39 @@ def randint(max_num: int) -> int:
     return _NUMBERS[_CURSOR] % max_num
 
 
+class RandomStream:
+    """
+    Seedable stream of random numbers, drawn from a NumPy generator in blocks and handed out one by one.
+    Every world has its own stream, spawn gives independent streams (e.g. per chunk or per worker)
+    from the same seed.
+    """
+
+    BLOCK_SIZE = 1 << 14
+
+    def __init__(self, seed: int or Tuple[int, ...] or None = None):
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % (1 << 32))
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self._numbers: List[int] = []
+
+    def randint(self, max_num: int) -> int:
+        """
+        Same contract as the module randint, a bit faster and without its 1024 numbers period.
+
+        :return: a random integer between 0 and max_num
+        """
+        try:
+            return self._numbers.pop() % max_num
+        except IndexError:
+            self._numbers = self.generator.integers(0, 1 << 30, self.BLOCK_SIZE).tolist()
+            return self._numbers.pop() % max_num
+
+    def spawn(self, *key: int) -> "RandomStream":
+        """ returns the independent stream identified by the given key, the same for the same seed and key """
+        return RandomStream((*(self.seed if isinstance(self.seed, tuple) else (self.seed,)), *key))
+
+
 if __name__ == "__main__":
     start_time = time()
     for _ in range(1000000):
@@ -32,5 +68,11 @@ if __name__ == "__main__":
     for _ in range(1000000):
         randint(10)
     semirandom_time = time() - start_time
+    stream_randint = RandomStream(0).randint
+    start_time = time()
+    for _ in range(1000000):
+        stream_randint(10)
+    stream_time = time() - start_time
     print(f"Random time: {random_time}")
     print(f"Semi-Random time: {semirandom_time}")
+    print(f"Random stream time: {stream_time}")
@@ -0,0 +1,245 @@
+from collections import deque
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import perf_counter, sleep
+from typing import List, Set, Tuple, Iterator, Deque
+
+import numpy as np
+
+from world.array_world import ArrayWorld
+from world.profiler import Profiler
+from world.replay import Session, Recorder, Recording, Command
+from world.world import World
+
+"""
+Runs a session on its own thread at a fixed timestep, so a slow tick doesn't slow the rendering down
+and the other way around. The inputs reach it as commands over a queue, every tick it publishes a Frame
+and the image of the world in a pair of color buffers: the renderer reads the front one while the next tick
+is copied in the back one.
+Ticks that come late are caught up back to back, and when the ticks keep going over their time budget
+the world's load level is raised so the costly systems only run every other tick
+(see GenericSystem.SHED_LEVEL).
+"""
+
+
+class ColorBuffers:
+    """ Two RGB images of the world, the simulation writes the back one and swaps them, the renderer reads """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.buffers: Tuple[bytearray, bytearray] = (
+            bytearray(width * height * 3), bytearray(width * height * 3)
+        )
+        self.front: int = 0
+        # held by the swap and by the renderer while it reads the front buffer, never while a tick runs
+        self.lock = Lock()
+
+    @property
+    def back(self) -> bytearray:
+        return self.buffers[1 - self.front]
+
+    def swap(self):
+        with self.lock:
+            self.front = 1 - self.front
+
+
+class Frame:
+    """ What the renderer needs to know about a tick """
+
+    def __init__(
+            self,
+            tick: int,
+            buffers: ColorBuffers,
+            changes: Set[int] or None,
+            tile_count: int,
+            inspected: Tuple[str, int or None] or None,
+            paused: bool,
+            ticks_per_second: int,
+            load_level: int
+    ):
+        # counts the published frames, a renderer that skipped some can't use the changes
+        self.tick = tick
+        self.buffers = buffers
+        # cells changed since the previous frame, None if unknown (e.g. for the NumPy worlds)
+        self.changes = changes
+        self.tile_count = tile_count
+        # name and heat of the tile at SimulationThread.inspected_position
+        self.inspected = inspected
+        self.paused = paused
+        # ticks run in the last second, and the load level of the world
+        self.ticks_per_second = ticks_per_second
+        self.load_level = load_level
+
+
+class SimulationThread(Thread):
+    """
+    Owns the session: applies the commands sent with send at the start of every tick, updates the world
+    and publishes the result in frame. A recording is fed one tick at a time instead of the sent commands,
+    a recorder gets the commands of every tick
+    """
+
+    TICK_RATE = 60
+    # late ticks caught up back to back at most, beyond that the lost time is dropped
+    MAX_CATCH_UP = 4
+    MAX_LOAD_LEVEL = 2
+    # ticks between two changes of the load level
+    LOAD_LEVEL_PERIOD = 30
+
+    def __init__(
+            self,
+            session: Session,
+            recorder: Recorder or None = None,
+            recording: Recording or None = None,
+            profiler: Profiler or None = None,
+            tick_rate: int = TICK_RATE
+    ):
+        super().__init__(name="Simulation", daemon=True)
+        self.session = session
+        self.tick_rate = tick_rate
+        # moving average of the time of a tick, against the budget of 1 / tick_rate
+        self.tick_seconds: float = 0
+        self.ticks_since_load_change: int = 0
+        self.load_level_command: Command or None = None
+        # end times of the ticks of the last second
+        self.tick_times: Deque[float] = deque()
+        self.recorder = recorder
+        self.recording = recording
+        self.replayed_frames: Iterator[List[Command]] or None = iter(recording) if recording else None
+        # set from the other threads, read at every tick
+        self.profiler = profiler
+        self.inspected_position: Tuple[int, int] or None = None
+        self.running: bool = True
+        self.commands: Queue = Queue()
+        self.frame: Frame or None = None
+        self.published_frames: int = 0
+        self.buffers: ColorBuffers or None = None
+        self.world: World or ArrayWorld or None = None
+        self.changes: Set[int] or None = None
+
+    def send(self, command: Command):
+        """ queues a command for the next tick, ["save", path] and ["load", path] are run by the thread """
+        self.commands.put(command)
+
+    def stop(self):
+        """ stops the thread after the tick it's running, the session is then free to use """
+        self.running = False
+        self.join()
+        self._unsubscribe()
+
+    def run(self):
+        next_tick_time = perf_counter()
+        while self.running:
+            now = perf_counter()
+            if now < next_tick_time:
+                sleep(next_tick_time - now)
+                continue
+            if now - next_tick_time > self.MAX_CATCH_UP / self.tick_rate:
+                # too late to catch up, the lost time is dropped
+                next_tick_time = now
+            self.tick()
+            next_tick_time += 1 / self.tick_rate
+
+    def tick(self):
+        start_time = perf_counter()
+        session = self.session
+        commands: List[Command] = []
+        # the load level goes through the commands so the recordings replay it
+        if self.load_level_command:
+            commands.append(self.load_level_command)
+            self.load_level_command = None
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except Empty:
+                break
+            # saves and loads depend on a file, they are never recorded
+            if command[0] == "save":
+                session.world.save(command[1])
+            elif command[0] == "load":
+                # a bad or outdated file leaves the current world as it is
+                try:
+                    world = World.load(command[1])
+                except (OSError, ValueError) as error:
+                    print(f"Couldn't load {command[1]}: {error}")
+                    continue
+                session.world.close()
+                session.world = world
+                session.world.load_level = session.load_level
+            else:
+                commands.append(command)
+        # while replaying the inputs are ignored, once the recording is over the session goes on live
+        if self.replayed_frames:
+            commands = next(self.replayed_frames, None)
+            if commands is None:
+                self.replayed_frames = None
+                print(f"Replay over: {self.recording.check(session)[1]}")
+                commands = []
+        if self.recorder:
+            self.recorder.record(commands)
+        for command in commands:
+            session.apply(command)
+        # a reset or a load gives a new world that has to be profiled too
+        session.world.profiler = self.profiler
+        session.update()
+        self.publish()
+        end_time = perf_counter()
+        self.tick_times.append(end_time)
+        while self.tick_times[0] < end_time - 1:
+            self.tick_times.popleft()
+        self.update_load_level(end_time - start_time)
+
+    def update_load_level(self, tick_seconds: float):
+        """ sheds load when the ticks go over their budget, and gets it back once they are well under it """
+        self.tick_seconds += (tick_seconds - self.tick_seconds) * 0.1
+        self.ticks_since_load_change += 1
+        if self.ticks_since_load_change < self.LOAD_LEVEL_PERIOD:
+            return
+        budget = 1 / self.tick_rate
+        load_level = self.session.load_level
+        if self.tick_seconds > budget and load_level < self.MAX_LOAD_LEVEL:
+            load_level += 1
+        elif self.tick_seconds < budget / 2 and load_level > 0:
+            load_level -= 1
+        else:
+            return
+        self.load_level_command = ["shed", load_level]
+        self.ticks_since_load_change = 0
+
+    def publish(self):
+        world = self.session.world
+        if world is not self.world:
+            self._unsubscribe()
+            self.world = world
+            if not self.buffers or (self.buffers.width, self.buffers.height) != (world.width, world.height):
+                self.buffers = ColorBuffers(world.width, world.height)
+            self.changes = world.journal.subscribe() if isinstance(world, World) else None
+            # the next frame has to be drawn whole
+            self.published_frames += 1
+        buffers = self.buffers
+        if isinstance(world, World):
+            buffers.back[:] = world.color_buffer
+            changes = set(self.changes)
+            self.changes.clear()
+        else:
+            back = np.frombuffer(buffers.back, np.uint8).reshape(world.height, world.width, 3)
+            back[:] = world.get_colors()
+            changes = None
+        buffers.swap()
+        inspected_position = self.inspected_position
+        self.published_frames += 1
+        self.frame = Frame(
+            self.published_frames,
+            buffers,
+            changes,
+            world.tile_count,
+            world.inspect(*inspected_position) if inspected_position else None,
+            self.session.paused,
+            len(self.tick_times),
+            self.session.load_level
+        )
+
+    def _unsubscribe(self):
+        if self.changes is not None:
+            self.world.journal.unsubscribe(self.changes)
+            self.changes = None
@@ -0,0 +1,242 @@
+from struct import Struct
+from typing import List, Tuple, Type, Dict
+
+import numpy as np
+
+from world.world import World, Tile, TileFlags
+from world.tiles import TILES
+
+"""
+Binary world snapshots.
+Layout: header, the names of the tile types (type id i is the i-th name, 0 is the empty cell),
+the dirty rect of every chunk and then one fixed size record per cell.
+The records are stored chunk by chunk, so a chunk is a contiguous slice of the memory mapped file
+and the tiles of a chunk are only created when the simulation or the user gets to it.
+"""
+
+MAGIC = b"OMBX"
+VERSION = 1
+# magic, version, width, height, chunk size, update count, number of tile types
+HEADER = Struct("<4sHIIHqH")
+# extra slots of a tile type (e.g. the duration of the fire) saved in the state field
+STATE_SLOTS = 2
+RECORD = np.dtype([
+    ("type", "u1"),
+    ("heat", "<i4"),
+    ("color", "u1", 3),
+    ("skip_update", "u1"),
+    ("cooldown", "u1"),
+    ("state", "<i4", STATE_SLOTS),
+])
+
+
+def get_state_slots(tile_type: Type[Tile]) -> Tuple[str, ...]:
+    """ returns the slots the tile type adds to the ones declared by Tile, base classes first """
+    return tuple(
+        name
+        for base in reversed(tile_type.__mro__)
+        if base is not Tile
+        for name in base.__dict__.get("__slots__", ())
+    )
+
+
+def get_chunk_layout(width: int, height: int, chunk_size: int) -> Tuple[np.ndarray, List[int]]:
+    """
+    returns the row major index (y * width + x) of every record in file order,
+    and the index of the first record of every chunk (plus the total number of records)
+    """
+    order: List[np.ndarray] = []
+    starts: List[int] = [0]
+    for min_y in range(0, height, chunk_size):
+        for min_x in range(0, width, chunk_size):
+            ys, xs = np.mgrid[min_y:min(min_y + chunk_size, height), min_x:min(min_x + chunk_size, width)]
+            order.append((ys * width + xs).reshape(-1))
+            starts.append(starts[-1] + order[-1].size)
+    return np.concatenate(order), starts
+
+
+def save_world(world: World, path: str):
+    """ writes the world to the given path, between two ticks """
+    if world.snapshot:
+        world.snapshot.load_all()
+    order, _ = get_chunk_layout(world.width, world.height, world.chunks.size)
+    position = np.empty(order.size, np.int64)
+    position[order] = np.arange(order.size)
+    type_ids: Dict[Type[Tile], int] = {tile_type: i + 1 for i, tile_type in enumerate(TILES)}
+    # gather the fields column by column, then write them in one go
+    indices: List[int] = []
+    types: List[int] = []
+    heats: List[int] = []
+    colors: List[Tuple[int, int, int]] = []
+    skips: List[int] = []
+    cooldowns: List[int] = []
+    states: List[List[int]] = []
+    state_slots: Dict[Type[Tile], Tuple[str, ...]] = {
+        tile_type: get_state_slots(tile_type) for tile_type in TILES
+    }
+    for tile in world.tiles:
+        tile_type = type(tile)
+        indices.append(tile.y * world.width + tile.x)
+        types.append(type_ids[tile_type])
+        heats.append(tile.heat if tile.FLAGS & TileFlags.HEAT else 0)
+        colors.append(tile.color)
+        if tile.FLAGS & TileFlags.MOVING:
+            skips.append(tile._skip_update)
+            cooldowns.append(tile._cooldown)
+        else:
+            skips.append(0)
+            cooldowns.append(0)
+        state = [getattr(tile, name) for name in state_slots[tile_type]]
+        states.append(state + [0] * (STATE_SLOTS - len(state)))
+    records = np.zeros(order.size, RECORD)
+    if indices:
+        record_indices = position[indices]
+        records["type"][record_indices] = types
+        records["heat"][record_indices] = heats
+        records["color"][record_indices] = colors
+        records["skip_update"][record_indices] = skips
+        records["cooldown"][record_indices] = cooldowns
+        records["state"][record_indices] = states
+    # the rects the chunks will update next tick, -1 for the sleeping ones
+    rects = np.full((len(world.chunks.chunks) * len(world.chunks.chunks[0]), 4), -1, "<i4")
+    for i, chunk in enumerate(chunk for row in world.chunks.chunks for chunk in row):
+        if chunk.dirty_rect:
+            rects[i] = chunk.dirty_rect
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(
+            MAGIC,
+            VERSION,
+            world.width,
+            world.height,
+            world.chunks.size,
+            world.update_count,
+            len(TILES)
+        ))
+        for tile_type in TILES:
+            name = tile_type.NAME.encode()
+            file.write(bytes((len(name),)) + name)
+        file.write(rects.tobytes())
+        file.write(records.tobytes())
+
+
+def load_world(path: str) -> World:
+    """ returns the world saved at the given path, its tiles are created lazily chunk by chunk """
+    with open(path, "rb") as file:
+        header = HEADER.unpack(file.read(HEADER.size))
+        magic, version, width, height, chunk_size, update_count, type_count = header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} world snapshot")
+        tiles_by_name: Dict[str, Type[Tile]] = {tile_type.NAME: tile_type for tile_type in TILES}
+        types: List[Type[Tile] or None] = [None]
+        for _ in range(type_count):
+            name = file.read(file.read(1)[0]).decode()
+            if name not in tiles_by_name:
+                raise ValueError(f"{path} contains the unknown tile type {name}")
+            types.append(tiles_by_name[name])
+        world = World(width, height, chunk_size)
+        world.update_count = update_count
+        chunks = [chunk for row in world.chunks.chunks for chunk in row]
+        rects = np.frombuffer(file.read(len(chunks) * 16), "<i4").reshape(-1, 4)
+        offset = file.tell()
+    for chunk, rect in zip(chunks, rects.tolist()):
+        if rect[0] >= 0 and chunk.mark(*rect):
+            world.chunks.dirty_chunks.append(chunk)
+    records = np.memmap(path, RECORD, "r", offset, (width * height,))
+    world.snapshot = SnapshotLoader(world, records, types)
+    return world
+
+
+class SnapshotLoader:
+    """ Creates the tiles of a loaded world chunk by chunk, straight from the memory mapped records """
+
+    def __init__(self, world: World, records: np.ndarray, types: List[Type[Tile] or None]):
+        self.world = world
+        self.records = records
+        self.types = types
+        self.state_slots: List[Tuple[str, ...]] = [
+            get_state_slots(tile_type) if tile_type else () for tile_type in types
+        ]
+        self.order, self.starts = get_chunk_layout(world.width, world.height, world.chunks.size)
+        self.columns = len(world.chunks.chunks[0])
+        # the colors are all needed for the first frame, and they don't need any tile
+        np.frombuffer(world.color_buffer, np.uint8).reshape(-1, 3)[self.order] = records["color"]
+        world.journal.record_all(range(world.width * world.height))
+        occupied = (records["type"] != 0).astype(np.int64)
+        self.chunk_tiles: List[int] = np.add.reduceat(occupied, self.starts[:-1]).tolist()
+        self.pending_tiles: int = sum(self.chunk_tiles)
+        self.loaded: List[bool] = [False] * (len(self.starts) - 1)
+        self.pending_chunks: int = len(self.loaded)
+
+    def load_chunk(self, index: int):
+        if self.loaded[index]:
+            return
+        self.loaded[index] = True
+        self.pending_chunks -= 1
+        if self.chunk_tiles[index]:
+            self._create_tiles(index)
+        if not self.pending_chunks:
+            # everything is loaded, release the file
+            self.world.snapshot = None
+
+    def _create_tiles(self, index: int):
+        world = self.world
+        records = self.records[self.starts[index]:self.starts[index + 1]]
+        occupied = np.flatnonzero(records["type"])
+        records = records[occupied]
+        cell_indices = self.order[self.starts[index] + occupied].tolist()
+        for cell_index, type_id, heat, color, skip_update, cooldown, state in zip(
+                cell_indices,
+                records["type"].tolist(),
+                records["heat"].tolist(),
+                records["color"].tolist(),
+                records["skip_update"].tolist(),
+                records["cooldown"].tolist(),
+                records["state"].tolist()
+        ):
+            tile_type = self.types[type_id]
+            # the saved state replaces everything __init__ would set up
+            tile: Tile = tile_type.__new__(tile_type)
+            tile.color = tuple(color)
+            tile.y, tile.x = divmod(cell_index, world.width)
+            tile.world = world
+            tile.active = True
+            tile.last_update = -1
+            flags = tile_type.FLAGS
+            if flags & TileFlags.HEAT:
+                tile.heat = heat
+                world.heat_tiles.append(tile)
+            if flags & TileFlags.MOVING:
+                tile._skip_update = skip_update
+                tile._cooldown = cooldown
+                world.moving_tiles.append(tile)
+            if flags & TileFlags.CUSTOM:
+                world.custom_tiles.append(tile)
+            for name, value in zip(self.state_slots[type_id], state):
+                setattr(tile, name, value)
+            world.tiles.append(tile)
+            # no set_tile, the color is already there and the chunk has its saved dirty rect
+            world.cells[world.get_index(tile.x, tile.y)] = tile
+        self.pending_tiles -= len(cell_indices)
+
+    def load_at(self, x: int, y: int):
+        """ loads the chunk of the given position, if it's inside the world """
+        if self.world.contains(x, y):
+            size = self.world.chunks.size
+            self.load_chunk(y // size * self.columns + x // size)
+
+    def load_awake(self):
+        """ loads the chunks updated this tick and their neighbours, the systems can read one cell around """
+        size = self.world.chunks.size
+        rows = len(self.loaded) // self.columns
+        for chunk in self.world.chunks.awake_chunks:
+            chunk_x = chunk.min_x // size
+            chunk_y = chunk.min_y // size
+            for neighbour_y in range(max(chunk_y - 1, 0), min(chunk_y + 2, rows)):
+                for neighbour_x in range(max(chunk_x - 1, 0), min(chunk_x + 2, self.columns)):
+                    self.load_chunk(neighbour_y * self.columns + neighbour_x)
+                    if not self.world.snapshot:
+                        return
+
+    def load_all(self):
+        for index in range(len(self.loaded)):
+            self.load_chunk(index)
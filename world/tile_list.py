@@ -0,0 +1,77 @@
+from time import time
+from typing import List, Dict, Iterator, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class TileList(Generic[T]):
+    """
+    Insertion ordered tile container with O(1) append, remove and membership test.
+
+    Removing a tile leaves a hole in its slot that iteration skips, the holes are compacted away
+    once they take up more than half of the slots.
+    Tiles appended while iterating are visited by the running iteration, like with a list.
+    """
+
+    def __init__(self):
+        self._slots: List[T or None] = []
+        self._indices: Dict[T, int] = {}
+
+    def append(self, tile: T):
+        self._indices[tile] = len(self._slots)
+        self._slots.append(tile)
+
+    def remove(self, tile: T):
+        self._slots[self._indices.pop(tile)] = None
+        if len(self._slots) > (len(self._indices) << 1) + 32:
+            self.compact()
+
+    def extend(self, tiles: List[T]):
+        start = len(self._slots)
+        self._slots += tiles
+        self._indices.update(zip(tiles, range(start, start + len(tiles))))
+
+    def remove_all(self, tiles: List[T]):
+        """ removes all the given tiles, compacting at most once """
+        slots = self._slots
+        indices = self._indices
+        for tile in tiles:
+            slots[indices.pop(tile)] = None
+        if len(slots) > (len(indices) << 1) + 32:
+            self.compact()
+
+    def compact(self):
+        """ removes the holes left by the removed tiles, keeping the order """
+        self._slots = [*self._indices]
+        self._indices = {tile: index for index, tile in enumerate(self._slots)}
+
+    def clear(self):
+        self._slots = []
+        self._indices = {}
+
+    def __iter__(self) -> Iterator[T]:
+        return filter(None, self._slots)
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __contains__(self, tile: T) -> bool:
+        return tile in self._indices
+
+
+if __name__ == "__main__":
+    from world.world import World
+    from world.tiles import ConcreteTile
+
+    for side in (32, 64, 128, 256, 512):
+        world = World(side, side)
+        for y in range(side):
+            for x in range(side):
+                world.add_tile(ConcreteTile, x, y)
+        for tile in world.tiles:
+            tile.remove()
+        start_time = time()
+        world.update()
+        delete_time = time() - start_time
+        tiles = side * side
+        print(f"Deleted {tiles} tiles in {delete_time:.4f}s ({delete_time / tiles * 1000000:.2f}us per tile)")
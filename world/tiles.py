@@ -1,7 +1,7 @@
 from typing import List, Type
 
-from world.world import Tile, GasTile, World, LiquidTile, SemiSolidTile, SolidTile, CustomTile, Dir, HeatTile
-from world.semirandom import randint
+from world.world import Tile, GasTile, World, LiquidTile, SemiSolidTile, SolidTile, CustomTile, Dir, \
+    HeatTile, TileFlags
 
 TILES: List[Type[Tile]] = []
 _TILES_TO_FIX: List[Type[Tile]] = []
@@ -19,12 +19,14 @@ def add_to_tile_list(tile: Type[Tile]) -> Type[Tile]:
 @add_to_tile_list
 class ConcreteTile(SolidTile):
 
+    __slots__ = ()
+
     NAME = "Concrete"
+    DENSITY = 100000
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (140 + randint(40), 140 + randint(40), 140 + randint(40)),
-            100000,
+            (140 + world.random.randint(40), 140 + world.random.randint(40), 140 + world.random.randint(40)),
             world,
             x,
             y
@@ -34,69 +36,77 @@ class ConcreteTile(SolidTile):
 @add_to_tile_list
 class StrangeMatterTile(SolidTile):
 
+    __slots__ = ()
+
     NAME = "Strange Matter"
+    DENSITY = 10000000
+    HEAT_TRANSFER_COEFFICIENT = 0
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (10 + randint(245), 10 + randint(245), 10 + randint(245)),
-            10000000,
+            (10 + world.random.randint(245), 10 + world.random.randint(245), 10 + world.random.randint(245)),
             world,
             x,
-            y,
-            heat_transfer_coefficient=0
+            y
         )
 
 
 @add_to_tile_list
 class WoodTile(SolidTile):
 
+    __slots__ = ()
+
     NAME = "Wood"
     UPPER_HEATH_THRESHOLD = 500, "BurningWood"
+    DENSITY = 10000
+    HEAT_TRANSFER_COEFFICIENT = 0.01
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (117 + randint(40), 63 + randint(40), 4 + randint(40)),
-            10000,
+            (117 + world.random.randint(40), 63 + world.random.randint(40), 4 + world.random.randint(40)),
             world,
             x,
-            y,
-            heat_transfer_coefficient=0.01
+            y
         )
 
 
 @add_to_tile_list
 class BurningWood(SolidTile):
 
+    __slots__ = ()
+
     NAME = "Burning Wood"
     UPPER_HEATH_THRESHOLD = 2000, "AshTile"
     LOWER_HEATH_THRESHOLD = 90, WoodTile
+    DENSITY = 100000
+    HEAT_TRANSFER_COEFFICIENT = 1
+    PASSIVE_HEATH_LOSS = -5
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (209 + randint(40), 118 + randint(40), 4),
-            100000,
+            (209 + world.random.randint(40), 118 + world.random.randint(40), 4),
             world,
             x,
             y,
-            base_heat=500,
-            heat_transfer_coefficient=1,
-            passive_heat_loss=-5
+            base_heat=500
         )
 
 
 @add_to_tile_list
 class GlassTile(SolidTile):
 
+    __slots__ = ()
+
     NAME = "Glass"
+    DENSITY = 100000
+    HEAT_TRANSFER_COEFFICIENT = 0.5
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (152 + randint(40), 203 + randint(40), 206 + randint(40)),
-            100000,
+            (152 + world.random.randint(40), 203 + world.random.randint(40), 206 + world.random.randint(40)),
             world,
             x,
-            y,
-            heat_transfer_coefficient=0.5
+            y
         )
 
 
@@ -106,30 +116,34 @@ class GlassTile(SolidTile):
 @add_to_tile_list
 class SandTile(SemiSolidTile):
 
+    __slots__ = ()
+
     NAME = "Sand"
     UPPER_HEATH_THRESHOLD = 800, GlassTile
+    DENSITY = 10
+    HEAT_TRANSFER_COEFFICIENT = 0.05
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (205-randint(50), 205-randint(50), 0),
-            10,
+            (205-world.random.randint(50), 205-world.random.randint(50), 0),
             world,
             x,
-            y,
-            heat_transfer_coefficient=0.05
+            y
         )
 
 
 @add_to_tile_list
 class RockTile(SemiSolidTile):
 
+    __slots__ = ()
+
     NAME = "Rock"
     UPPER_HEATH_THRESHOLD = 1000, "LavaTile"
+    DENSITY = 800
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (40-randint(10), 40-randint(10), 50-randint(10)),
-            800,
+            (40-world.random.randint(10), 40-world.random.randint(10), 50-world.random.randint(10)),
             world,
             x,
             y
@@ -139,13 +153,15 @@ class RockTile(SemiSolidTile):
 @add_to_tile_list
 class IceTile(SemiSolidTile):
 
+    __slots__ = ()
+
     NAME = "Ice"
     UPPER_HEATH_THRESHOLD = 10, "WaterTile"
+    DENSITY = 1
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (200-randint(20), 200-randint(20), 255-randint(20)),
-            1,
+            (200-world.random.randint(20), 200-world.random.randint(20), 255-world.random.randint(20)),
             world,
             x,
             y,
@@ -156,12 +172,14 @@ class IceTile(SemiSolidTile):
 @add_to_tile_list
 class AshTile(SemiSolidTile):
 
+    __slots__ = ()
+
     NAME = "Ash"
+    DENSITY = 1
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (140-randint(20), 140-randint(20), 140-randint(20)),
-            1,
+            (140-world.random.randint(20), 140-world.random.randint(20), 140-world.random.randint(20)),
             world,
             x,
             y,
@@ -172,13 +190,15 @@ class AshTile(SemiSolidTile):
 @add_to_tile_list
 class GunpowderTile(SemiSolidTile):
 
+    __slots__ = ()
+
     NAME = "Gun powder"
     UPPER_HEATH_THRESHOLD = 500, "ExplosionTile"
+    DENSITY = 4
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (40-randint(20), 40-randint(20), 40-randint(20)),
-            4,
+            (40-world.random.randint(20), 40-world.random.randint(20), 40-world.random.randint(20)),
             world,
             x,
             y
@@ -190,14 +210,17 @@ class GunpowderTile(SemiSolidTile):
 @add_to_tile_list
 class WaterTile(LiquidTile):
 
+    __slots__ = ()
+
     NAME = "Water"
+    DISPERSION_RATE = 5
     UPPER_HEATH_THRESHOLD = 100, "VaporTile"
     LOWER_HEATH_THRESHOLD = 0, IceTile
+    DENSITY = 2
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (0, 0, 155+randint(100)),
-            2,
+            (0, 0, 155+world.random.randint(100)),
             world,
             x,
             y,
@@ -207,13 +230,15 @@ class WaterTile(LiquidTile):
 @add_to_tile_list
 class OilTile(LiquidTile):
 
+    __slots__ = ()
+
     NAME = "Oil"
     UPPER_HEATH_THRESHOLD = 300, "FireTile"
+    DENSITY = 1
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (193-randint(20), 193-randint(20), 69-randint(10)),
-            1,
+            (193-world.random.randint(20), 193-world.random.randint(20), 69-world.random.randint(10)),
             world,
             x,
             y,
@@ -224,31 +249,37 @@ class OilTile(LiquidTile):
 @add_to_tile_list
 class LavaTile(LiquidTile):
 
+    __slots__ = ()
+
     NAME = "Lava"
+    DISPERSION_RATE = 1
     LOWER_HEATH_THRESHOLD = 500, RockTile
+    DENSITY = 1000
+    HEAT_TRANSFER_COEFFICIENT = 0.1
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (255 - randint(20), 0, 0),
-            1000,
+            (255 - world.random.randint(20), 0, 0),
             world,
             x,
             y,
-            base_heat=10000,
-            heat_transfer_coefficient=0.1
+            base_heat=10000
         )
 
 
 @add_to_tile_list
 class LiquidNitrogen(LiquidTile):
 
+    __slots__ = ()
+
     NAME = "Liquid Nitrogen"
+    DISPERSION_RATE = 6
     UPPER_HEATH_THRESHOLD = 0, None
+    DENSITY = 0
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
             (255, 255, 255),
-            0,
             world,
             x,
             y,
@@ -261,36 +292,42 @@ class LiquidNitrogen(LiquidTile):
 @add_to_tile_list
 class VaporTile(GasTile):
 
+    __slots__ = ()
+
     NAME = "Vapor"
+    POOLED = True
     LOWER_HEATH_THRESHOLD = 60, WaterTile
+    DENSITY = 0
+    PASSIVE_HEATH_LOSS = 1
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (255-randint(20), 255-randint(20), 255-randint(20)),
-            0,
+            (255-world.random.randint(20), 255-world.random.randint(20), 255-world.random.randint(20)),
             world,
             x,
             y,
-            base_heat=220 + randint(120),
-            passive_heat_loss=1
+            base_heat=220 + world.random.randint(120)
         )
 
 
 @add_to_tile_list
 class SmokeTile(GasTile):
 
+    __slots__ = ()
+
     NAME = "Smoke"
+    POOLED = True
     LOWER_HEATH_THRESHOLD = 100, None
+    DENSITY = 0
+    PASSIVE_HEATH_LOSS = 1
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (50-randint(20), 50-randint(20), 50-randint(20)),
-            0,
+            (50-world.random.randint(20), 50-world.random.randint(20), 50-world.random.randint(20)),
             world,
             x,
             y,
-            base_heat=300 + randint(120),
-            passive_heat_loss=1
+            base_heat=300 + world.random.randint(120)
         )
 
 
@@ -299,7 +336,11 @@ class SmokeTile(GasTile):
 @add_to_tile_list
 class FireTile(CustomTile):
 
+    __slots__ = ("duration",)
+
     NAME = "Fire"
+    POOLED = True
+    DENSITY = -2
 
     DIRECTIONS = (
         (Dir.UP, Dir.UP_LEFT, Dir.UP_RIGHT),
@@ -313,44 +354,47 @@ class FireTile(CustomTile):
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (242-randint(20), 141-randint(20), 0),
-            -2,
+            (242-world.random.randint(20), 141-world.random.randint(20), 0),
             world,
             x,
             y
         )
-        self.duration: int = 180 + randint(180)
+        self.duration: int = 180 + world.random.randint(180)
 
     def custom_update(self):
-        for direction in self.DIRECTIONS[randint(7)]:
-            next_pos = self.get_next_pos(direction)
-            if not next_pos.valid:
-                continue
-            checked_tile: Tile = self.world.spatial_matrix[next_pos.y][next_pos.x]
+        for direction in self.DIRECTIONS[self.world.random.randint(7)]:
+            next_x = self.x + direction[0]
+            next_y = self.y + direction[1]
+            checked_tile: Tile = self.world.get_tile(next_x, next_y)
             if not checked_tile:
-                self.world.spatial_matrix[self.y][self.x] = None
-                self.x = next_pos.x
-                self.y = next_pos.y
-                self.world.spatial_matrix[self.y][self.x] = self
+                self.world.set_tile(self.x, self.y, None)
+                self.x = next_x
+                self.y = next_y
+                self.world.set_tile(self.x, self.y, self)
                 break
-            elif checked_tile in self.world.heat_tiles:
+            elif checked_tile.FLAGS & TileFlags.HEAT:
                 checked_tile.heat += 100
+                checked_tile.keep_awake()
                 self.duration -= 50
                 break
         self.duration -= 1
         if self.duration <= 0:
             self.remove()
+        else:
+            self.keep_awake()
 
 
 @add_to_tile_list
 class GreyGooTile(CustomTile):
 
+    __slots__ = ()
+
     NAME = "Grey Goo"
+    DENSITY = 0
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
             (180, 180, 180),
-            0,
             world,
             x,
             y
@@ -366,19 +410,22 @@ class GreyGooTile(CustomTile):
 @add_to_tile_list
 class AcidTile(LiquidTile, CustomTile):
 
+    __slots__ = ()
+
     NAME = "Acid"
+    DENSITY = 0
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
-            (0, 235 + randint(20), 0),
-            0,
+            (0, 235 + world.random.randint(20), 0),
             world,
             x,
             y
         )
 
     def custom_update(self):
-        if randint(20) != 0:
+        self.keep_awake()
+        if self.world.random.randint(20) != 0:
             return
         for direction in Dir.ALL:
             tile: Tile = self.get_neighbour_tile(direction)
@@ -391,39 +438,32 @@ class AcidTile(LiquidTile, CustomTile):
 @add_to_tile_list
 class ExplosionTile(HeatTile, CustomTile):
 
+    __slots__ = ("range", "tile_duration")
+
     NAME = "Explosion"
+    POOLED = True
+    DENSITY = 10000
+    RESIDUE = SmokeTile
+    BLAST_HEAT = 2000
 
     def __init__(self, world: World, x: int, y: int):
         super().__init__(
             (255, 255, 0),
-            10000,
             world,
             x,
             y,
-            base_heat=2000
+            base_heat=self.BLAST_HEAT
         )
         self.range: int = 10
         self.tile_duration: int = 2
 
     def custom_update(self):
         if self.tile_duration == 0:
-            if self.range != 0:
-                new_range = self.range - 1
-                for direction in (Dir.UP, Dir.LEFT, Dir.RIGHT, Dir.DOWN):
-                    next_pos = self.get_next_pos(direction)
-                    if not next_pos.valid:
-                        continue
-                    checked_tile: Tile = self.world.spatial_matrix[next_pos.y][next_pos.x]
-                    if checked_tile and (type(checked_tile) != ExplosionTile):
-                        checked_tile.remove()
-                    new_tile = self.world.add_tile(ExplosionTile, next_pos.x, next_pos.y)
-                    new_tile.range = new_range
-            else:
-                new_tile = SmokeTile(self.world, self.x, self.y)
-                self.world.tiles_to_add.append(new_tile)
-            self.remove()
+            # the blast is resolved with all the explosions of the tick
+            self.world.explosions.detonate(self)
         else:
             self.tile_duration -= 1
+            self.keep_awake()
 
     def update_temperature(self):
         self.do_exchange_heat()
@@ -1,7 +1,14 @@
-from functools import cache
-from typing import Tuple, List, Type, Iterable, Callable
+from sys import maxsize
+from typing import Tuple, List, Type, Iterable, Callable, Dict, TYPE_CHECKING
 
-from world.semirandom import randint
+from world.chunks import ChunkGrid, Chunk
+from world.journal import ChangeJournal
+from world.profiler import Profiler
+from world.semirandom import RandomStream
+from world.tile_list import TileList
+
+if TYPE_CHECKING:
+    from world.snapshot import SnapshotLoader
 
 
 class Dir:
@@ -27,43 +34,71 @@ class Dir:
         RIGHT,
     )
 
+    # one direction of every pair of neighbours, following them from every cell visits each adjacency once
+    FORWARD = (
+        DOWN,
+        DOWN_LEFT,
+        DOWN_RIGHT,
+        RIGHT,
+    )
+
 
 class TileFlags:
-    CAN_MOVE = 0
-    TRANSMITS_HEAT = 1
+    """ Component bitmask, every tile type carries in FLAGS the union of the flags of its components """
 
+    NONE = 0
+    MOVING = 1
+    HEAT = 2
+    CUSTOM = 4
 
-class NextPosition:
 
-    def __init__(self, x: int, y: int, valid: bool):
-        self.x = x
-        self.y = y
-        self.valid = valid
+EMPTY_COLOR: Tuple[int, int, int] = (0, 0, 0)
 
 
 class Tile:
+    """
+    Per-type constants (NAME, DENSITY, thresholds, ...) live on the class and are shared by all its tiles.
+    Every class of the hierarchy declares __slots__: the per-tile state of all the components is declared
+    here, so tiles carry no __dict__ and every tile type has the same layout.
+    """
+
+    __slots__ = ("color", "x", "y", "world", "active", "last_update", "heat", "_skip_update", "_cooldown")
 
     NAME: str
+    DENSITY: int
+    COMPONENT_FLAG: int = TileFlags.NONE
+    FLAGS: int = TileFlags.NONE
+    # True if the type adds no slots to the ones declared here, its tiles can then change type in place
+    BASE_LAYOUT: bool = True
+    # short lived types created and deleted in bulk, the world keeps their deleted tiles for reuse
+    POOLED: bool = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # precompute the component bitmask of the type
+        cls.FLAGS = TileFlags.NONE
+        for base in cls.__mro__:
+            cls.FLAGS |= base.__dict__.get("COMPONENT_FLAG", TileFlags.NONE)
+        # a class without __slots__ gets a __dict__, the layout differs even if it adds no slot
+        cls.BASE_LAYOUT = cls.__dictoffset__ == 0 and cls.__basicsize__ == Tile.__basicsize__
 
     def __init__(
             self,
             color: Tuple[int, int, int],
-            density: int,
             world: "World",
             x: int,
             y: int
     ):
         # render stuff
         self.color = color
-        # Physics stuff
-        self.density = density
         # position
         self.x = x
         self.y = y
         self.world = world
         # control flags
         self.active: bool = True
-        self.last_update: int = 0
+        # -1 so that tiles added before the first tick get updated in it and don't let their chunk sleep
+        self.last_update: int = -1
 
     def remove(self):
         if self.active:
@@ -74,34 +109,20 @@ class Tile:
 
     def add(self):
         self.world.tiles.append(self)
-        self.world.spatial_matrix[self.y][self.x] = self
-
-    def delete(self):
-        self.world.tiles.remove(self)
-        self.world.spatial_matrix[self.y][self.x] = None
-
-    def get_next_pos(self, relative_vector: Tuple[int, int]) -> NextPosition:
-        # returns the world position given a vector relative to the tile
-        next_x: int = self.x + relative_vector[0]
-        if not 0 <= next_x < self.world.width:
-            return NextPosition(0, 0, False)
-        next_y: int = self.y + relative_vector[1]
-        if not 0 <= next_y < self.world.height:
-            return NextPosition(0, 0, False)
-        return NextPosition(next_x, next_y, True)
+        self.world.set_tile(self.x, self.y, self)
+
+    def keep_awake(self):
+        """ keeps the chunk of the tile awake for the next tick, for tiles that change without moving """
+        self.world.chunks.mark_dirty(self.x, self.y)
 
     def get_neighbour_tile(self, direction: Tuple[int, int]) -> "Tile" or None:
-        next_pos = self.get_next_pos(direction)
-        if not next_pos.valid:
-            return None
-        checked_tile = self.world.spatial_matrix[next_pos.y][next_pos.x]
-        if not checked_tile:
-            return None
-        return checked_tile
+        return self.world.get_neighbour(self.x, self.y, direction)
 
     def transform(self, new_type: type) -> "Tile" or None:
         if self.remove():
-            new_tile = new_type(self.world, self.x, self.y)
+            if self.world.profiler:
+                self.world.profiler.transforms += 1
+            new_tile = self.world.create_tile(new_type, self.x, self.y)
             self.world.tiles_to_add.append(new_tile)
             return new_tile
         return None
@@ -109,10 +130,17 @@ class Tile:
 
 class MovingTile(Tile):
 
+    __slots__ = ()
+
+    COMPONENT_FLAG = TileFlags.MOVING
     _MAX_UPDATE_SKIP = 3
+    # cells a sideways move can cover in one step, see try_disperse
+    DISPERSION_RATE: int = 1
+    # where the tile goes when nothing holds it, a dispersing tile stops over the first cell it can go to
+    FALL_DIRECTION: Tuple[int, int] = Dir.DOWN
 
-    def __init__(self, color: Tuple[int, int, int], density: int, world: "World", x: int, y: int):
-        super().__init__(color, density, world, x, y)
+    def __init__(self, color: Tuple[int, int, int], world: "World", x: int, y: int):
+        super().__init__(color, world, x, y)
         self._skip_update: int = 0
         self._cooldown: int = 0
 
@@ -120,45 +148,79 @@ class MovingTile(Tile):
         super().add()
         self.world.moving_tiles.append(self)
 
-    def delete(self):
-        super().delete()
-        self.world.moving_tiles.remove(self)
-
     def move(self, new_x: int, new_y: int, replacement_tile: "Tile" or None):
-        self.world.spatial_matrix[self.y][self.x] = replacement_tile
+        self.world.set_tile(self.x, self.y, replacement_tile)
         self.x = new_x
         self.y = new_y
-        self.world.spatial_matrix[self.y][self.x] = self
+        self.world.set_tile(self.x, self.y, self)
 
     def try_move(self, direction: Tuple[int, int]) -> bool:
-        next_pos = self.get_next_pos(direction)
-        if not next_pos.valid:
-            return False
-        checked_tile = self.world.spatial_matrix[next_pos.y][next_pos.x]
+        world = self.world
+        next_x: int = self.x + direction[0]
+        next_y: int = self.y + direction[1]
+        # the border of the grid is made of walls, no need to check the bounds
+        checked_tile = world.cells[(next_y + 1) * world.stride + next_x + 1]
         if not checked_tile:
-            self.move(next_pos.x, next_pos.y, None)
+            self.move(next_x, next_y, None)
+            if world.profiler:
+                world.profiler.moves += 1
             return True
-        elif checked_tile.density < self.density:
+        elif checked_tile.DENSITY < self.DENSITY:
             checked_tile.x = self.x
             checked_tile.y = self.y
-            checked_tile.last_update = self.world.update_count
-            self.move(next_pos.x, next_pos.y, replacement_tile=checked_tile)
+            checked_tile.last_update = world.update_count
+            self.move(next_x, next_y, replacement_tile=checked_tile)
+            if world.profiler:
+                world.profiler.swaps += 1
             return True
         return False
 
+    def try_disperse(self, direction: Tuple[int, int]) -> bool:
+        """
+        moves the tile along its row in the given sideways direction, through up to DISPERSION_RATE empty
+        cells. It stops early over a cell it can fall in, if the next cell is taken it tries a normal move
+        (a swap)
+        """
+        world = self.world
+        cells = world.cells
+        step = direction[0]
+        index = (self.y + 1) * world.stride + self.x + 1
+        fall_offset = world.offsets[self.FALL_DIRECTION]
+        distance = 0
+        while distance < self.DISPERSION_RATE and not cells[index + step]:
+            distance += 1
+            index += step
+            if not cells[index + fall_offset]:
+                break
+        if not distance:
+            return self.try_move(direction)
+        self.move(self.x + distance * step, self.y, None)
+        if world.profiler:
+            world.profiler.moves += 1
+        return True
+
     def check_directions(self, directions: Iterable[Tuple[int, int]]):
         if self._cooldown == 0:
             for direction in directions:
-                if self.try_move(direction):
+                if direction[1] or self.DISPERSION_RATE == 1:
+                    moved = self.try_move(direction)
+                else:
+                    moved = self.try_disperse(direction)
+                if moved:
                     self._skip_update = 0
                     self.last_update = self.world.update_count
                     return
         else:
             self._cooldown -= 1
+            # a failed move doesn't keep the tile awake, but a countdown has to get to the next try
+            self.keep_awake()
             return
         if self._skip_update != self._MAX_UPDATE_SKIP:
             self._skip_update += 1
-        self._cooldown = self._skip_update
+            self._cooldown = self._skip_update
+        else:
+            # settled: the tile lets its chunk sleep, a change next to it wakes it up for another try
+            self._cooldown = 0
 
     def update_position(self):
         raise NotImplemented
@@ -166,88 +228,124 @@ class MovingTile(Tile):
 
 class HeatTile(Tile):
 
+    __slots__ = ()
+
+    COMPONENT_FLAG = TileFlags.HEAT
     UPPER_HEATH_THRESHOLD: Tuple[int, Type[Tile]] or None = None
     LOWER_HEATH_THRESHOLD: Tuple[int, Type[Tile]] or None = None
+    HEAT_TRANSFER_COEFFICIENT: float = 1
+    PASSIVE_HEATH_LOSS: int = 0
 
     check_thresholds: Callable
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # optimize threshold check, picked once per type
+        if cls.UPPER_HEATH_THRESHOLD and (not cls.LOWER_HEATH_THRESHOLD):
+            cls.check_thresholds = cls.check_upper_threshold
+        elif (not cls.UPPER_HEATH_THRESHOLD) and cls.LOWER_HEATH_THRESHOLD:
+            cls.check_thresholds = cls.check_lower_threshold
+        elif cls.UPPER_HEATH_THRESHOLD and cls.LOWER_HEATH_THRESHOLD:
+            cls.check_thresholds = cls.check_both_thresholds
+        else:
+            cls.check_thresholds = cls.check_no_threshold
+
     def __init__(
             self,
             color: Tuple[int, int, int],
-            density: int,
             world: "World",
             x: int,
             y: int,
-            base_heat: int = 25,
-            heat_transfer_coefficient: float = 1,
-            passive_heat_loss: int = 0
+            base_heat: int = 25
     ):
-        super().__init__(color, density, world, x, y)
+        super().__init__(color, world, x, y)
         self.heat = base_heat
-        self.heat_transfer_coefficient = heat_transfer_coefficient
-        self.passive_heath_loss = passive_heat_loss
-        # optimize threshold check
-        if self.UPPER_HEATH_THRESHOLD and (not self.LOWER_HEATH_THRESHOLD):
-            self.check_thresholds = self.check_upper_threshold
-        elif (not self.UPPER_HEATH_THRESHOLD) and self.LOWER_HEATH_THRESHOLD:
-            self.check_thresholds = self.check_lower_threshold
-        elif self.UPPER_HEATH_THRESHOLD and self.LOWER_HEATH_THRESHOLD:
-            self.check_thresholds = self.check_both_thresholds
-        else:
-            self.check_thresholds = self.check_no_threshold
 
     def add(self):
         super().add()
         self.world.heat_tiles.append(self)
 
-    def delete(self):
-        super().delete()
-        self.world.heat_tiles.remove(self)
-
     def check_no_threshold(self) -> bool:
         return False
 
     def check_upper_threshold(self) -> bool:
         if self.heat >= self.UPPER_HEATH_THRESHOLD[0]:
-            if self.UPPER_HEATH_THRESHOLD[1]:
-                new_tile = self.transform(self.UPPER_HEATH_THRESHOLD[1])
-                if new_tile:
-                    new_tile.heat = self.heat
-                return True
-            self.remove()
+            self.world.transitions.append((self, self.UPPER_HEATH_THRESHOLD[1]))
             return True
         return False
 
     def check_lower_threshold(self) -> bool:
         if self.heat <= self.LOWER_HEATH_THRESHOLD[0]:
-            if self.LOWER_HEATH_THRESHOLD[1]:
-                new_tile = self.transform(self.LOWER_HEATH_THRESHOLD[1])
-                if new_tile:
-                    new_tile.heat = self.heat
-                return True
-            self.remove()
+            self.world.transitions.append((self, self.LOWER_HEATH_THRESHOLD[1]))
             return True
         return False
 
     def check_both_thresholds(self) -> bool:
         return self.check_upper_threshold() or self.check_lower_threshold()
 
-    def exchange_heat(self, target_tile: "HeatTile"):
-        htc: float = self.heat_transfer_coefficient + target_tile.heat_transfer_coefficient
-        exchanged_heat = int((target_tile.heat - self.heat) * htc) >> 2
+    def apply_transition(self, new_type: Type[Tile] or None):
+        """
+        turns the tile into one of the type it crossed a threshold to (None removes it), keeping its heat.
+        Types with the same layout are swapped in place: the class of the tile changes and the constructor
+        of the new type runs on it for its color and state, so no tile is created and the tile lists only
+        change with the components. The others (e.g. fire, explosions) go through transform
+        """
+        if not self.active:
+            return
+        if not new_type:
+            self.remove()
+            return
+        heat = self.heat
+        if not (self.BASE_LAYOUT and new_type.BASE_LAYOUT):
+            new_tile = self.transform(new_type)
+            if new_tile:
+                new_tile.heat = heat
+            return
+        world = self.world
+        old_flags = self.FLAGS
+        self.__class__ = new_type
+        new_type.__init__(self, world, self.x, self.y)
+        self.heat = heat
+        for flag, tiles in world.component_lists:
+            if (old_flags ^ new_type.FLAGS) & flag:
+                if new_type.FLAGS & flag:
+                    tiles.append(self)
+                else:
+                    tiles.remove(self)
+        world.set_tile(self.x, self.y, self)
+        if world.profiler:
+            world.profiler.transforms += 1
+
+    def exchange_heat(self, target_tile: "HeatTile") -> int:
+        """
+        exchanges heat with the target tile, once per pair and tick, returns the heat received.
+        The rate h * (4 - h) / 8 is what the two exchanges of h / 4 per pair used to add up to, it never
+        goes past the average of the two tiles; truncating towards zero makes pairs closer than a few degrees
+        stop exchanging
+        """
+        htc: float = self.HEAT_TRANSFER_COEFFICIENT + target_tile.HEAT_TRANSFER_COEFFICIENT
+        exchanged_heat = int((target_tile.heat - self.heat) * htc * (4 - htc) / 8)
         self.heat += exchanged_heat
         target_tile.heat -= exchanged_heat
-
-    @cache
-    def can_tile_exchange_heat(self, tile):
-        return (tile is not None) and (tile in self.world.heat_tiles)
+        return exchanged_heat
 
     def do_exchange_heat(self):
-        self.heat -= self.passive_heath_loss
-        for direction in Dir.ALL:
-            tile: Tile = self.get_neighbour_tile(direction)
-            if self.can_tile_exchange_heat(tile):
-                self.exchange_heat(tile)
+        self.heat -= self.PASSIVE_HEATH_LOSS
+        exchanged: bool = False
+        cells = self.world.cells
+        index = self.world.get_index(self.x, self.y)
+        # the other half of the neighbours exchange with this tile when they are updated
+        for offset in self.world.forward_offsets:
+            tile: Tile = cells[index + offset]
+            if tile and (tile.FLAGS & TileFlags.HEAT):
+                if self.exchange_heat(tile):
+                    # the neighbours of the other tile exchange with it too
+                    tile.keep_awake()
+                    exchanged = True
+        # the heat of the tile or of its neighbours changed, keep them updating.
+        # Tiles at equilibrium with all their neighbours let their cells go to sleep
+        if exchanged or self.PASSIVE_HEATH_LOSS:
+            self.keep_awake()
         self.check_thresholds()
 
     def update_temperature(self):
@@ -256,24 +354,135 @@ class HeatTile(Tile):
 
 class CustomTile(Tile):
 
+    __slots__ = ()
+
+    COMPONENT_FLAG = TileFlags.CUSTOM
+
     def add(self):
         super().add()
         self.world.custom_tiles.append(self)
 
-    def delete(self):
-        super().delete()
-        self.world.custom_tiles.remove(self)
-
     def custom_update(self):
         raise NotImplemented
 
 
+class WallTile(Tile):
+    """ Sentinel filling the border of the grid: never active, never moved and without components """
+
+    __slots__ = ()
+
+    NAME = "Wall"
+    DENSITY = maxsize
+
+    def __init__(self):
+        super().__init__(EMPTY_COLOR, None, -1, -1)
+        # an inactive tile can't be removed nor transformed
+        self.active = False
+
+
+WALL = WallTile()
+
+
+class ExplosionManager:
+    """
+    Resolves together all the explosions going off in a tick, at the end of the custom pass.
+    The blast of an explosion is worked out in one pass: a flood over the empty cells up to its range
+    (a diamond that stops at obstacles) clears them, the first layer of obstacles around it is destroyed
+    (unless they are explosions too) and the heat tiles around it exchange heat once with BLAST_HEAT,
+    so the tiles that cross a threshold (e.g. gun powder) turn into their new type instead of being destroyed.
+    The outer front of the flood leaves the RESIDUE of the explosion
+    """
+
+    def __init__(self, world: "World"):
+        self.world = world
+        self.offsets: Tuple[int, ...] = tuple(world.offsets[direction] for direction in (
+            Dir.UP, Dir.LEFT, Dir.RIGHT, Dir.DOWN
+        ))
+        self.ring_offsets: Tuple[int, ...] = tuple(world.offsets[direction] for direction in Dir.ALL)
+        # explosions going off this tick, they need a range attribute, a BLAST_HEAT and a RESIDUE type
+        self.detonated: List[Tile] = []
+
+    def detonate(self, tile: Tile):
+        self.detonated.append(tile)
+
+    def update(self):
+        if not self.detonated:
+            return
+        world = self.world
+        cells = world.cells
+        stride = world.stride
+        offsets = self.offsets
+        destroyed: List[Tile] = []
+        # cell index -> heat tile around a blast
+        heated: Dict[int, HeatTile] = {}
+        for tile in self.detonated:
+            tile_type = type(tile)
+            start = (tile.y + 1) * stride + tile.x + 1
+            reached = {start}
+            front = [start]
+            for _ in range(tile.range):
+                next_front = []
+                for index in front:
+                    for offset in offsets:
+                        next_index = index + offset
+                        checked_tile = cells[next_index]
+                        if not checked_tile:
+                            if next_index not in reached:
+                                reached.add(next_index)
+                                next_front.append(next_index)
+                        elif checked_tile is not WALL and type(checked_tile) is not tile_type:
+                            destroyed.append(checked_tile)
+                front = next_front
+            for index in front:
+                y, x = divmod(index, stride)
+                world.tiles_to_add.append(world.create_tile(tile.RESIDUE, x - 1, y - 1))
+            blast_heat = tile.BLAST_HEAT
+            blast_htc = tile.HEAT_TRANSFER_COEFFICIENT
+            ring = {index + offset for index in reached for offset in self.ring_offsets} - reached
+            for index in ring:
+                checked_tile = cells[index]
+                if not checked_tile or type(checked_tile) is tile_type:
+                    continue
+                if checked_tile.FLAGS & TileFlags.HEAT:
+                    # the same exchange as HeatTile.exchange_heat, with a tile at the heat of the blast
+                    htc = checked_tile.HEAT_TRANSFER_COEFFICIENT + blast_htc
+                    checked_tile.heat += int((blast_heat - checked_tile.heat) * htc * (4 - htc) / 8)
+                    heated[index] = checked_tile
+            tile.remove()
+        self.detonated.clear()
+        for tile in heated.values():
+            tile.keep_awake()
+            tile.check_thresholds()
+        # the tiles that transform are removed by the transition, the blast destroys the rest
+        world.apply_transitions()
+        for tile in destroyed:
+            tile.remove()
+
+
 class GenericSystem:
 
     NAME: str
+    FLAG: int = TileFlags.NONE
+    # from this load level on the system only runs every other tick, None if it always runs
+    SHED_LEVEL: int or None = None
 
     def __init__(self, world: "World"):
         self.world = world
+        # tiles visited by the last update, read by the profiler
+        self.tiles: List[Tile] = []
+        # rects of the ticks the system skipped, visited on its next update
+        self.missed_rects: Dict[Chunk, List[int]] = {}
+
+    def collect_tiles(self) -> List[Tile]:
+        """ returns the tiles with the component of the system in the awake part of the world """
+        self.tiles = self.world.chunks.collect_tiles(
+            self.world.cells, self.world.stride, self.FLAG, self.missed_rects
+        )
+        return self.tiles
+
+    def is_due(self, tick: int, load_level: int) -> bool:
+        """ returns whether the system runs in the given tick, systems shed on odd levels run on odd ticks """
+        return self.SHED_LEVEL is None or load_level < self.SHED_LEVEL or tick % 2 == self.SHED_LEVEL % 2
 
     def update(self):
         raise NotImplemented
@@ -282,9 +491,10 @@ class GenericSystem:
 class MovementSystem(GenericSystem):
 
     NAME = "Movement System"
+    FLAG = TileFlags.MOVING
 
     def update(self):
-        for tile in self.world.moving_tiles:
+        for tile in self.collect_tiles():
             if tile.last_update != self.world.update_count:
                 tile.update_position()
 
@@ -292,39 +502,76 @@ class MovementSystem(GenericSystem):
 class HeathSystem(GenericSystem):
 
     NAME = "Heath System"
+    FLAG = TileFlags.HEAT
+    SHED_LEVEL = 1
 
     def update(self):
-        for tile in self.world.heat_tiles:
+        for tile in self.collect_tiles():
             tile.update_temperature()
+        self.world.apply_transitions()
 
 
 class CustomTileSystem(GenericSystem):
 
     NAME = "Custom Tile System"
+    FLAG = TileFlags.CUSTOM
+    SHED_LEVEL = 2
 
     def update(self):
-        for tile in self.world.custom_tiles:
+        for tile in self.collect_tiles():
             tile.custom_update()
+        self.world.explosions.update()
 
 
 class World:
 
-    def __init__(self, width: int, height: int):
+    # deleted tiles kept per pooled type at most
+    POOL_SIZE = 4096
+
+    def __init__(self, width: int, height: int, chunk_size: int = 32, seed: int or None = None):
         self.width = width
         self.height = height
+        # every random number of the world comes from here, so the same seed and inputs give the same world
+        self.random = RandomStream(seed)
         # init tile lists
-        self.tiles: List[Tile] = []
-        self.moving_tiles: List[MovingTile] = []
-        self.heat_tiles: List[HeatTile] = []
-        self.custom_tiles: List[CustomTile] = []
+        self.tiles: TileList[Tile] = TileList()
+        self.moving_tiles: TileList[MovingTile] = TileList()
+        self.heat_tiles: TileList[HeatTile] = TileList()
+        self.custom_tiles: TileList[CustomTile] = TileList()
+        self.component_lists: Tuple[Tuple[int, TileList[Tile]], ...] = (
+            (TileFlags.MOVING, self.moving_tiles),
+            (TileFlags.HEAT, self.heat_tiles),
+            (TileFlags.CUSTOM, self.custom_tiles)
+        )
         self.tiles_to_delete: List[Tile] = []
         self.tiles_to_add: List[Tile] = []
-        # init world matrices
-        init_matrix: List[List[Tile or None]] = []
+        # tiles that crossed a heat threshold and the type they turn into, applied at the end of the heat pass
+        self.transitions: List[Tuple[HeatTile, Type[Tile] or None]] = []
+        # deleted tiles of the pooled types, reused by create_tile
+        self.pools: Dict[Type[Tile], List[Tile]] = {}
+        # init the grid: a flat list of rows with a border of walls, (x, y) is at (y + 1) * stride + x + 1
+        self.stride = width + 2
+        self.cells: List[Tile or None] = [WALL] * self.stride
         for _ in range(height):
-            init_matrix.append([None for _ in range(width)])
-        self.spatial_matrix: Tuple[List[Tile], ...] = tuple(init_matrix)
-        print(f"world size: x {len(self.spatial_matrix[0])}, y {len(self.spatial_matrix)}")
+            self.cells += [WALL, *(None for _ in range(width)), WALL]
+        self.cells += [WALL] * self.stride
+        # flat index offset of every direction, and of the neighbours the heat exchange visits (Dir.FORWARD)
+        self.offsets: Dict[Tuple[int, int], int] = {
+            direction: direction[1] * self.stride + direction[0] for direction in Dir.ALL
+        }
+        self.forward_offsets: Tuple[int, ...] = tuple(self.offsets[direction] for direction in Dir.FORWARD)
+        print(f"world size: x {width}, y {height}")
+        self.chunks = ChunkGrid(width, height, chunk_size)
+        # RGB image of the world, kept up to date by set_tile
+        self.color_buffer = bytearray(width * height * 3)
+        self.journal = ChangeJournal()
+        # set by load, creates the tiles of the loaded chunks on demand
+        self.snapshot: "SnapshotLoader" or None = None
+        # set to instrument the updates
+        self.profiler: Profiler or None = None
+        self.explosions = ExplosionManager(self)
+        # raised under load to run the costly systems every other tick, see GenericSystem.SHED_LEVEL
+        self.load_level: int = 0
         # init systems
         self.systems: Iterable[GenericSystem] = (
             MovementSystem(self),
@@ -333,49 +580,219 @@ class World:
         )
         self.update_count: int = 0
 
-    def add_tile(self, tile_type: type, x: int, y: int) -> Tile:
-        """ adds a tile at the given position and returns it """
-        new_tile: Tile = tile_type(self, x, y)
-        if not self.spatial_matrix[y][x]:
-            new_tile.add()
+    def set_tile(self, x: int, y: int, tile: Tile or None):
+        """ writes a cell of the grid, updating its color, the change journal and waking up its chunk """
+        self.cells[(y + 1) * self.stride + x + 1] = tile
+        index = y * self.width + x
+        self.color_buffer[index * 3:index * 3 + 3] = tile.color if tile else EMPTY_COLOR
+        self.journal.record(index)
+        self.chunks.mark_dirty(x, y)
+
+    def contains(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get_index(self, x: int, y: int) -> int:
+        """ returns the index of the given position in the grid, the border is at -1 and width / height """
+        return (y + 1) * self.stride + x + 1
+
+    def get_tile(self, x: int, y: int) -> Tile or None:
+        return self.cells[(y + 1) * self.stride + x + 1]
+
+    def get_neighbour(self, x: int, y: int, direction: Tuple[int, int]) -> Tile or None:
+        """ returns the tile next to the given position in the given direction, None if empty or outside """
+        tile = self.cells[(y + direction[1] + 1) * self.stride + x + direction[0] + 1]
+        return tile if tile is not WALL else None
+
+    def create_tile(self, tile_type: Type[Tile], x: int, y: int) -> Tile:
+        """ returns a new tile of the given type, not added to the world yet, reusing a deleted one if any """
+        pool = self.pools.get(tile_type)
+        if pool:
+            tile = pool.pop()
+            # the constructor resets every slot the type uses
+            tile_type.__init__(tile, self, x, y)
+            return tile
+        return tile_type(self, x, y)
+
+    def add_tile(self, tile_type: Type[Tile], x: int, y: int) -> Tile or None:
+        """ adds a tile at the given position if the cell is free, returns it or None if taken or outside """
+        if not self.contains(x, y):
+            return None
+        if self.snapshot:
+            self.snapshot.load_at(x, y)
+        if self.get_tile(x, y):
+            return None
+        new_tile = self.create_tile(tile_type, x, y)
+        new_tile.add()
         return new_tile
 
-    def delete_tile(self, x: int, y: int) -> Tile:
+    def delete_tile(self, x: int, y: int) -> Tile or None:
         """ Removes a tile at the given position and returns it """
-        tile = self.spatial_matrix[y][x]
+        if not self.contains(x, y):
+            return None
+        if self.snapshot:
+            self.snapshot.load_at(x, y)
+        tile = self.get_tile(x, y)
         if tile:
             tile.remove()
         return tile
 
+    def fill_region(self, tile_type: Type[Tile], positions: Iterable[Tuple[int, int]]) -> int:
+        """
+        adds tiles of the given type on the free cells among the given positions (see world.brush),
+        the positions outside the world are skipped. Returns the number of tiles added
+        """
+        cells = self.cells
+        stride = self.stride
+        added: List[Tile] = []
+        for x, y in positions:
+            if not self.contains(x, y):
+                continue
+            if self.snapshot:
+                self.snapshot.load_at(x, y)
+            # taken cells are skipped before creating anything, the new tiles claim their cells right away
+            if not cells[(y + 1) * stride + x + 1]:
+                tile = self.create_tile(tile_type, x, y)
+                self.set_tile(x, y, tile)
+                added.append(tile)
+        self.register_tiles(added)
+        return len(added)
+
+    def clear_region(self, positions: Iterable[Tuple[int, int]]) -> int:
+        """ removes the tiles at the given positions (see world.brush), returns the number removed """
+        cells = self.cells
+        stride = self.stride
+        removed: int = 0
+        for x, y in positions:
+            if not self.contains(x, y):
+                continue
+            if self.snapshot:
+                self.snapshot.load_at(x, y)
+            tile = cells[(y + 1) * stride + x + 1]
+            if tile and tile.remove():
+                removed += 1
+        return removed
+
+    def inspect(self, x: int, y: int) -> Tuple[str, int or None] or None:
+        """ returns the name and the heat (None if the tile has no heat) of the tile at the given position """
+        if not self.contains(x, y):
+            return None
+        if self.snapshot:
+            self.snapshot.load_at(x, y)
+        tile = self.get_tile(x, y)
+        if not tile:
+            return None
+        return tile.NAME, tile.heat if tile.FLAGS & TileFlags.HEAT else None
+
+    @property
+    def tile_count(self) -> int:
+        if self.snapshot:
+            return len(self.tiles) + self.snapshot.pending_tiles
+        return len(self.tiles)
+
+    def save(self, path: str):
+        """ saves the world in a binary snapshot, see world.snapshot """
+        from world.snapshot import save_world
+        save_world(self, path)
+
+    @staticmethod
+    def load(path: str) -> "World":
+        """ returns the world saved at the given path, memory mapped with its chunks loaded on demand """
+        from world.snapshot import load_world
+        return load_world(path)
+
     def update(self):
-        # update systems
+        self.chunks.begin_tick()
+        if self.snapshot:
+            self.snapshot.load_awake()
+        systems = []
         for system in self.systems:
-            system.update()
-        # delete tiles that need to be deleted
+            if system.is_due(self.update_count, self.load_level):
+                systems.append(system)
+            else:
+                # the skipped system finds the tiles of this tick on its next update
+                self.chunks.defer(system.missed_rects)
+        if self.profiler:
+            self.profiler.begin_tick(self.update_count)
+            for system in systems:
+                self.profiler.run(system.NAME, system.update)
+                self.profiler.count_tiles(system.NAME, system.tiles)
+            self.profiler.run("Add / delete", self.commit_changes)
+            self.profiler.end_tick()
+        else:
+            # update systems
+            for system in systems:
+                system.update()
+            self.commit_changes()
+        self.update_count += 1
+
+    def release_tile(self, tile: Tile):
+        """ hands a tile that left the world to the pool of its type """
+        if tile.POOLED:
+            pool = self.pools.setdefault(type(tile), [])
+            if len(pool) < self.POOL_SIZE:
+                pool.append(tile)
+
+    def commit_changes(self):
+        """
+        applies the deletions and additions queued during the tick in bulk: every tile list is updated once.
+        Tiles removed before being added are dropped, and an addition only takes a cell that is empty once the
+        deletions are done and not claimed by an earlier addition
+        """
+        cells = self.cells
+        stride = self.stride
         if self.tiles_to_delete:
-            for tile in self.tiles_to_delete:
-                tile.delete()
-                del tile
+            deleted = [tile for tile in self.tiles_to_delete if tile in self.tiles]
+            self.tiles.remove_all(deleted)
+            for flag, tiles in self.component_lists:
+                tiles.remove_all([tile for tile in deleted if tile.FLAGS & flag])
+            for tile in deleted:
+                if cells[(tile.y + 1) * stride + tile.x + 1] is tile:
+                    self.set_tile(tile.x, tile.y, None)
+                self.release_tile(tile)
             self.tiles_to_delete.clear()
-        # add tiles that need to be added
         if self.tiles_to_add:
+            added: List[Tile] = []
             for tile in self.tiles_to_add:
-                tile.add()
-                del tile
+                if tile.active and not cells[(tile.y + 1) * stride + tile.x + 1]:
+                    self.set_tile(tile.x, tile.y, tile)
+                    added.append(tile)
+                else:
+                    self.release_tile(tile)
+            self.register_tiles(added)
             self.tiles_to_add.clear()
-        self.update_count += 1
+
+    def register_tiles(self, tiles: List[Tile]):
+        """ adds tiles already written in their cells to the tile lists, every list is extended once """
+        self.tiles.extend(tiles)
+        for flag, tile_list in self.component_lists:
+            tile_list.extend([tile for tile in tiles if tile.FLAGS & flag])
+
+    def apply_transitions(self):
+        """ changes the type of the tiles that crossed a heat threshold during the heat pass, in one go """
+        for tile, new_type in self.transitions:
+            tile.apply_transition(new_type)
+        self.transitions.clear()
+
+    def close(self):
+        """ releases the resources held by the world """
+        self.snapshot = None
+        self.pools.clear()
 
 
 # Tile types --------------------------------------
 
 class SolidTile(HeatTile):
 
+    __slots__ = ()
+
     def update_temperature(self):
         self.do_exchange_heat()
 
 
 class SemiSolidTile(HeatTile, MovingTile):
 
+    __slots__ = ()
+
     DIRECTIONS = (Dir.DOWN, Dir.DOWN_LEFT, Dir.DOWN_RIGHT)
 
     def update_position(self):
@@ -387,13 +804,16 @@ class SemiSolidTile(HeatTile, MovingTile):
 
 class LiquidTile(HeatTile, MovingTile):
 
+    __slots__ = ()
+
+    DISPERSION_RATE = 4
     DIRECTIONS = (
         (Dir.DOWN, Dir.DOWN_LEFT, Dir.LEFT, Dir.DOWN_RIGHT, Dir.RIGHT),
         (Dir.DOWN, Dir.DOWN_RIGHT, Dir.RIGHT, Dir.DOWN_LEFT, Dir.LEFT)
     )
 
     def update_position(self):
-        self.check_directions(self.DIRECTIONS[randint(2)])
+        self.check_directions(self.DIRECTIONS[self.world.random.randint(2)])
 
     def update_temperature(self):
         self.do_exchange_heat()
@@ -401,13 +821,69 @@ class LiquidTile(HeatTile, MovingTile):
 
 class GasTile(HeatTile, MovingTile):
 
+    __slots__ = ()
+
+    DISPERSION_RATE = 3
+    FALL_DIRECTION = Dir.UP
     DIRECTIONS = (
         (Dir.UP, Dir.UP_LEFT, Dir.LEFT, Dir.UP_RIGHT, Dir.RIGHT),
         (Dir.UP, Dir.UP_RIGHT, Dir.RIGHT, Dir.UP_LEFT, Dir.LEFT)
     )
 
     def update_position(self):
-        self.check_directions(self.DIRECTIONS[randint(2)])
+        self.check_directions(self.DIRECTIONS[self.world.random.randint(2)])
 
     def update_temperature(self):
         self.do_exchange_heat()
+
+
+if __name__ == "__main__":
+    from time import time
+    from world.tiles import WaterTile
+
+    class _NextPosition:
+        """ the position object every lookup used to allocate, kept here as the baseline """
+
+        def __init__(self, x: int, y: int, valid: bool):
+            self.x = x
+            self.y = y
+            self.valid = valid
+
+    def allocating_lookup(x: int, y: int, direction: Tuple[int, int]) -> Tile or None:
+        next_x = x + direction[0]
+        next_y = y + direction[1]
+        if not (0 <= next_x < bench_world.width and 0 <= next_y < bench_world.height):
+            next_pos = _NextPosition(0, 0, False)
+        else:
+            next_pos = _NextPosition(next_x, next_y, True)
+        if not next_pos.valid:
+            return None
+        return bench_world.get_tile(next_pos.x, next_pos.y)
+
+    bench_world = World(256, 256)
+    for tile_y in range(0, 256, 2):
+        for tile_x in range(256):
+            bench_world.add_tile(WaterTile, tile_x, tile_y)
+    lookups = 256 * 256 * len(Dir.ALL)
+    for name, lookup in (
+            ("NextPosition", allocating_lookup),
+            ("World.get_neighbour", bench_world.get_neighbour)
+    ):
+        start_time = time()
+        for tile_y in range(256):
+            for tile_x in range(256):
+                for neighbour_direction in Dir.ALL:
+                    lookup(tile_x, tile_y, neighbour_direction)
+        lookup_time = time() - start_time
+        print(f"{name}: {lookup_time / lookups * 1000000000:.1f}ns per lookup")
+    # what the heat exchange does: one index per tile, then index + offset for the neighbours ahead of it
+    start_time = time()
+    bench_cells = bench_world.cells
+    for tile_y in range(256):
+        for tile_x in range(256):
+            tile_index = bench_world.get_index(tile_x, tile_y)
+            for forward_offset in bench_world.forward_offsets:
+                bench_cells[tile_index + forward_offset]
+    lookup_time = time() - start_time
+    lookups = 256 * 256 * len(bench_world.forward_offsets)
+    print(f"flat grid forward offsets: {lookup_time / lookups * 1000000000:.1f}ns per lookup")